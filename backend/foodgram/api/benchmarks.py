@@ -0,0 +1,30 @@
+import statistics
+import time
+
+from recipes.models import Recipe, Tag
+
+
+def get_filter_cases():
+    """Комбинации параметров RecipeFilter для замеров списка рецептов."""
+    slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+    author = Recipe.objects.values_list('author', flat=True).first()
+    return (
+        ('all', {}),
+        ('author', {'author': [author]}),
+        ('tags', {'tags': slugs[:1]}),
+        ('tags x2', {'tags': slugs}),
+        ('is_favorited', {'is_favorited': ['1']}),
+        ('is_in_shopping_cart', {'is_in_shopping_cart': ['1']}),
+        ('author + tags', {'author': [author], 'tags': slugs[:1]}),
+        ('tags + is_favorited', {'tags': slugs, 'is_favorited': ['1']}),
+    )
+
+
+def measure(func, repeat):
+    """Медиана времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
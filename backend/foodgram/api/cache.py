@@ -0,0 +1,101 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from users.models import Follow
+
+
+class RecipeListCache:
+    """Кэш страниц списка рецептов для анонимных пользователей.
+
+    Ключ строится из нормализованных параметров запроса и токенов
+    поколений: 'global' (справочники и профили авторов), 'all'
+    (страницы без фильтров), 'author:<id>' и 'tag:<slug>'. Изменение
+    рецепта обновляет только токены, от которых зависят затронутые
+    страницы (с учётом вложенных рецептов автора, см. api.signals),
+    поэтому остальные записи остаются валидными до TIMEOUT.
+    """
+    prefix = 'recipes:list'
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_LIST_CACHE_ALIAS]
+
+    def get_scopes(self, query_params):
+        authors = query_params.getlist('author')
+        if authors:
+            return [f'author:{author}' for author in authors]
+        tags = query_params.getlist('tags')
+        if tags:
+            return [f'tag:{tag}' for tag in tags]
+        return ['all']
+
+    def get_tokens(self, scopes):
+        keys = [f'{self.prefix}:token:{scope}' for scope in scopes]
+        tokens = self.cache.get_many(keys)
+        for key in keys:
+            if key not in tokens:
+                self.cache.add(key, uuid.uuid4().hex, timeout=None)
+                tokens[key] = self.cache.get(key)
+        return [tokens[key] for key in keys]
+
+    def make_key(self, request):
+        params = sorted(
+            (name, sorted(value for value in values if value))
+            for name, values in request.query_params.lists()
+        )
+        scopes = ['global'] + self.get_scopes(request.query_params)
+        raw = repr((request.get_host(), params, self.get_tokens(scopes)))
+        return f'{self.prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        self.cache.set(key, data)
+
+    def invalidate(self, authors=(), tags=(), everything=False):
+        scopes = ['all']
+        scopes += [f'author:{author}' for author in authors]
+        scopes += [f'tag:{tag}' for tag in tags]
+        if everything:
+            scopes.append('global')
+        self.cache.set_many(
+            {
+                f'{self.prefix}:token:{scope}': uuid.uuid4().hex
+                for scope in scopes
+            },
+            timeout=None,
+        )
+
+
+recipe_list_cache = RecipeListCache()
+
+
+class FollowedAuthorsCache:
+    """Короткоживущий кэш id авторов, на которых подписан пользователь."""
+
+    @property
+    def cache(self):
+        return caches[settings.FEED_CACHE_ALIAS]
+
+    def make_key(self, user_id):
+        return f'feed:authors:{user_id}'
+
+    def get(self, user):
+        key = self.make_key(user.pk)
+        author_ids = self.cache.get(key)
+        if author_ids is None:
+            author_ids = list(Follow.objects.filter(
+                user=user
+            ).values_list('author_id', flat=True))
+            self.cache.set(key, author_ids, settings.FEED_CACHE_TIMEOUT)
+        return author_ids
+
+    def invalidate(self, user_id):
+        self.cache.delete(self.make_key(user_id))
+
+
+followed_authors_cache = FollowedAuthorsCache()
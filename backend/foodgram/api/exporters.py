@@ -0,0 +1,61 @@
+import csv
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class Echo:
+    """Псевдо-файл, возвращающий записанную строку вместо буферизации."""
+
+    def write(self, value):
+        return value
+
+
+class TxtExporter:
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def export(self, ingredients):
+        yield 'Список покупок:\n'
+        for name, unit, amount in ingredients:
+            yield f'\n{name} - {amount}, {unit}'
+
+
+class CsvExporter:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def export(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for name, unit, amount in ingredients:
+            yield writer.writerow((name, amount, unit))
+
+
+class JsonExporter:
+    content_type = 'application/json'
+    extension = 'json'
+
+    def export(self, ingredients):
+        separator = ''
+        yield '['
+        for name, unit, amount in ingredients:
+            yield separator + json.dumps(
+                {'name': name, 'amount': amount, 'measurement_unit': unit},
+                ensure_ascii=False,
+            )
+            separator = ','
+        yield ']'
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TxtExporter, CsvExporter, JsonExporter)
+}
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Не даёт DRF трактовать ?format= как выбор рендерера."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -1,18 +1,41 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import (
+    Case, Exists, IntegerField, OuterRef, Value, When,
+)
 from django_filters.rest_framework import filters, FilterSet
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe, Tag
+from recipes.catalog import tag_catalog
+from recipes.models import Recipe
+from recipes.search import ingredient_index
 from users.models import User
 
 
+TAGS_MATCH = {
+    'any': 'Хотя бы один из тегов',
+    'all': 'Все теги',
+}
+
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'recent': ('-pub_date', '-id'),
+    'quick': ('cooking_time', '-id'),
+}
+
+
 class RecipeFilter(FilterSet):
+    # Автор — внешний ключ рецепта, дубликатов нет и DISTINCT не нужен.
     author = filters.ModelMultipleChoiceFilter(
-        queryset=User.objects.all(),
+        queryset=User.objects.all(), distinct=False,
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [(tag.slug, tag.name) for tag in tag_catalog.all()],
+        method='get_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=tuple(TAGS_MATCH.items()),
+        method='get_tags_match'
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited'
@@ -20,10 +43,15 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=tuple((key, key) for key in RECIPE_ORDERINGS),
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_match', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering')
 
     def apply_filter(self, queryset, filter_name, filter_key, user_check):
         if self.request.user.is_authenticated and user_check:
@@ -31,12 +59,53 @@ class RecipeFilter(FilterSet):
             return queryset.filter(**filter_parameters)
         return queryset
 
+    def get_tags(self, queryset, name, value):
+        # Exists по таблице связей вместо JOIN: рецепт попадает в
+        # выборку один раз, и DISTINCT не нужен.
+        slugs = set(value)
+        tag_ids = [tag.pk for tag in tag_catalog.all() if tag.slug in slugs]
+        links = Recipe.tags.through.objects.filter(recipe_id=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            return queryset.filter(*(
+                Exists(links.filter(tag_id=tag_id)) for tag_id in tag_ids
+            ))
+        return queryset.filter(Exists(links.filter(tag_id__in=tag_ids)))
+
+    def get_tags_match(self, queryset, name, value):
+        return queryset
+
     def get_is_favorited(self, queryset, name, value):
         return self.apply_filter(queryset, name, "favorites__user", value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         return self.apply_filter(queryset, name, "carts__user", value)
 
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
 
-class IngredientFilter(SearchFilter):
+
+class IngredientFilter(BaseFilterBackend):
+    """Поиск ингредиентов: сначала совпадения по началу названия,
+    затем по вхождению подстроки. Выдача ограничена
+    INGREDIENT_SEARCH_LIMIT."""
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name:
+            return queryset
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if connections[queryset.db].vendor == 'postgresql':
+            return queryset.filter(name__icontains=name).annotate(
+                is_substring=Case(
+                    When(name__istartswith=name, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            ).order_by('is_substring', 'name')[:limit]
+        found = ingredient_index.search(name, limit)
+        return queryset.filter(pk__in=found).order_by(Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(found)),
+            output_field=IntegerField(),
+        ))
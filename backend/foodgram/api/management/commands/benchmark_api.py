@@ -0,0 +1,326 @@
+import json
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.benchmarks import get_filter_cases
+from api.metrics import QueryTimer, track_queries
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAA'
+    'ACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class Scenario:
+    def __init__(self, name, request, anonymous=False, write=False,
+                 serial=False):
+        self.name = name
+        self.request = request
+        self.anonymous = anonymous
+        self.write = write
+        self.serial = serial
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и пропускную способность горячих '
+            'эндпоинтов API и сохраняет сравнимый отчёт в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Сначала наполнить БД тестовыми данными.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Число запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--scenario', action='append', default=[],
+                            help='Запускать только сценарии, в названии '
+                                 'которых есть эта подстрока.')
+        parser.add_argument('--user', type=int,
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Сохранить отчёт в JSON-файл.')
+        parser.add_argument('--compare',
+                            help='JSON-отчёт предыдущего запуска.')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Допустимый рост p50 в процентах '
+                                 'относительно --compare.')
+
+    def handle(self, *args, **options):
+        rand = random.Random(options['random_seed'])
+        if options['seed']:
+            call_command(
+                'seed_data', users=options['users'],
+                recipes=options['recipes'], seed=options['random_seed'],
+                stdout=self.stdout,
+            )
+        self.user = self.get_user(options['user'])
+        self.local = threading.local()
+        scenarios = [
+            scenario for scenario in self.get_scenarios(rand)
+            if not options['scenario'] or any(
+                part in scenario.name for part in options['scenario'])
+        ]
+        results = {}
+        # Картинки из сценариев записи сохраняются в хранилище до отката
+        # транзакции, поэтому пишутся во временный MEDIA_ROOT.
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                MEDIA_ROOT=media_root,
+            ):
+                for scenario in scenarios:
+                    results[scenario.name] = result = self.run_scenario(
+                        scenario, options)
+                    self.stdout.write(
+                        f'{scenario.name:<36} '
+                        f'p50 {result["p50_ms"]:8.2f} ms  '
+                        f'p95 {result["p95_ms"]:8.2f} ms  '
+                        f'{result["throughput_rps"]:8.1f} rps  '
+                        f'{result["queries"]:3d} SQL'
+                    )
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        report = {'meta': self.get_meta(options), 'scenarios': results}
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(report, options['compare'], options['threshold'])
+
+    def get_user(self, user_id):
+        queryset = User.objects.filter(favorites__isnull=False)
+        if user_id is not None:
+            queryset = User.objects.filter(pk=user_id)
+        user = queryset.first()
+        if user is None:
+            raise CommandError(
+                'Нет подходящего пользователя: запустите команду с --seed.'
+            )
+        return user
+
+    def get_scenarios(self, rand):
+        for name, params in get_filter_cases():
+            yield Scenario(
+                f'recipes: {name}',
+                lambda client, index, params=params: client.get(
+                    '/api/recipes/', params),
+            )
+        yield Scenario(
+            'recipes: anonymous',
+            lambda client, index: client.get('/api/recipes/'),
+            anonymous=True,
+        )
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:10000])
+        if recipe_ids:
+            sample = rand.sample(recipe_ids, min(100, len(recipe_ids)))
+            yield Scenario(
+                'recipe detail',
+                lambda client, index: client.get(
+                    f'/api/recipes/{sample[index % len(sample)]}/'),
+            )
+        yield Scenario(
+            'subscriptions',
+            lambda client, index: client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 3}),
+        )
+        names = list(Ingredient.objects.values_list('name', flat=True)[:5000])
+        if names:
+            prefixes = [
+                name[:3] for name in rand.sample(names, min(50, len(names)))
+            ]
+            yield Scenario(
+                'ingredient search',
+                lambda client, index: client.get(
+                    '/api/ingredients/',
+                    {'name': prefixes[index % len(prefixes)]}),
+            )
+        ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)[:5000])
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        if ingredient_ids and tag_ids:
+            payloads = [
+                self.get_payload(rand, index, ingredient_ids, tag_ids)
+                for index in range(20)
+            ]
+            yield Scenario(
+                'recipe create',
+                lambda client, index: client.post(
+                    '/api/recipes/', payloads[index % len(payloads)],
+                    format='json'),
+                write=True,
+            )
+            own_recipe = Recipe.objects.filter(author=self.user).first()
+            if own_recipe is not None:
+                yield Scenario(
+                    'recipe update',
+                    lambda client, index: client.patch(
+                        f'/api/recipes/{own_recipe.pk}/',
+                        payloads[index % len(payloads)], format='json'),
+                    write=True,
+                    # Параллельная правка одного рецепта - не реальная
+                    # нагрузка: транзакции блокируют одни и те же строки.
+                    serial=True,
+                )
+        yield Scenario(
+            'download_shopping_cart',
+            lambda client, index: client.get(
+                '/api/recipes/download_shopping_cart/'),
+        )
+
+    def get_payload(self, rand, index, ingredient_ids, tag_ids):
+        return {
+            'name': f'Бенчмарк {index}',
+            'text': 'Рецепт для замеров',
+            'cooking_time': rand.randint(1, 180),
+            'image': IMAGE,
+            'tags': rand.sample(tag_ids, min(2, len(tag_ids))),
+            'ingredients': [
+                {'id': pk, 'amount': rand.randint(1, 500)}
+                for pk in rand.sample(
+                    ingredient_ids, min(8, len(ingredient_ids)))
+            ],
+        }
+
+    def get_client(self, anonymous):
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            self.local.clients = clients = {}
+        if anonymous not in clients:
+            client = APIClient(raise_request_exception=False)
+            if not anonymous:
+                client.force_authenticate(self.user)
+            clients[anonymous] = client
+        return clients[anonymous]
+
+    def run_request(self, scenario, index):
+        client = self.get_client(scenario.anonymous)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with track_queries(timer), transaction.atomic():
+            response = scenario.request(client, index)
+            if response.streaming:
+                size = len(b''.join(response.streaming_content))
+            else:
+                size = len(response.content)
+            # Изменения из сценариев записи не сохраняются.
+            transaction.set_rollback(scenario.write)
+        elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, timer.count, size, response.status_code
+
+    def run_worker(self, scenario, indexes):
+        try:
+            return [self.run_request(scenario, index) for index in indexes]
+        finally:
+            connections.close_all()
+
+    def run_scenario(self, scenario, options):
+        for index in range(options['warmup']):
+            self.run_request(scenario, index)
+        total, concurrency = options['requests'], options['concurrency']
+        if scenario.serial or (
+            # SQLite не допускает параллельных транзакций записи.
+            scenario.write and connection.vendor == 'sqlite'
+        ):
+            concurrency = 1
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as executor:
+                chunks = executor.map(
+                    lambda offset: self.run_worker(
+                        scenario, range(offset, total, concurrency)),
+                    range(concurrency),
+                )
+                samples = [sample for chunk in chunks for sample in chunk]
+        else:
+            samples = [
+                self.run_request(scenario, index) for index in range(total)
+            ]
+        wall = time.perf_counter() - start
+        timings = sorted(sample[0] for sample in samples)
+        statuses = {}
+        for sample in samples:
+            statuses[str(sample[3])] = statuses.get(str(sample[3]), 0) + 1
+        return {
+            'requests': len(samples),
+            'statuses': statuses,
+            'min_ms': timings[0],
+            'mean_ms': statistics.fmean(timings),
+            'p50_ms': self.percentile(timings, 50),
+            'p95_ms': self.percentile(timings, 95),
+            'p99_ms': self.percentile(timings, 99),
+            'max_ms': timings[-1],
+            'throughput_rps': len(samples) / wall,
+            'queries': int(statistics.median(
+                sample[1] for sample in samples)),
+            'response_bytes': int(statistics.fmean(
+                sample[2] for sample in samples)),
+        }
+
+    def percentile(self, timings, percent):
+        position = (len(timings) - 1) * percent / 100
+        lower = int(position)
+        upper = min(lower + 1, len(timings) - 1)
+        return timings[lower] + (
+            timings[upper] - timings[lower]) * (position - lower)
+
+    def get_meta(self, options):
+        return {
+            'created': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'django': django.get_version(),
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'concurrency': options['concurrency'],
+            'random_seed': options['random_seed'],
+            'rows': {
+                model._meta.label: model.objects.count()
+                for model in (User, Recipe, Ingredient, Favorite, Cart,
+                              Follow)
+            },
+        }
+
+    def compare(self, report, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['scenarios']
+        regressions = []
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for name, result in report['scenarios'].items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            change = (
+                result['p50_ms'] / previous['p50_ms'] - 1
+            ) * 100 if previous['p50_ms'] else 0
+            line = (f'{name:<36} {previous["p50_ms"]:8.2f} -> '
+                    f'{result["p50_ms"]:8.2f} ms ({change:+.1f}%), SQL '
+                    f'{previous["queries"]} -> {result["queries"]}')
+            if change > threshold or result['queries'] > previous['queries']:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f'Регрессия в сценариях: {", ".join(regressions)}'
+            )
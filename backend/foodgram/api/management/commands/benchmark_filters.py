@@ -0,0 +1,96 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory
+
+from api.benchmarks import get_filter_cases, measure
+from api.filters import RecipeFilter
+from recipes.models import AmountOfIngridients, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Замеряет запросы списка рецептов для комбинаций фильтров '
+            'RecipeFilter и выводит их планы EXPLAIN.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Сначала наполнить БД тестовыми данными.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--user', type=int,
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Сохранить отчёт в JSON-файл.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            call_command(
+                'seed_data', users=options['users'],
+                recipes=options['recipes'], seed=options['random_seed'],
+                stdout=self.stdout,
+            )
+        user = self.get_user(options['user'])
+        report = []
+        for name, queryset in self.get_cases(user):
+            page = queryset[:options['page_size']]
+            result = {
+                'case': name,
+                'page_ms': measure(
+                    lambda: list(page.all()), options['repeat']),
+                'count_ms': measure(
+                    queryset.count, options['repeat']),
+                'plan': self.explain(page),
+            }
+            report.append(result)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f'  page: {result["page_ms"]:.2f} ms, '
+                f'count: {result["count_ms"]:.2f} ms'
+            )
+            for line in result['plan'].splitlines():
+                self.stdout.write(f'  {line}')
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump({'vendor': connection.vendor, 'cases': report},
+                          file, ensure_ascii=False, indent=2)
+
+    def get_user(self, user_id):
+        queryset = User.objects.filter(favorites__isnull=False)
+        if user_id is not None:
+            queryset = User.objects.filter(pk=user_id)
+        user = queryset.first()
+        if user is None:
+            raise CommandError(
+                'Нет подходящего пользователя: запустите команду с --seed.'
+            )
+        return user
+
+    def get_cases(self, user):
+        factory = RequestFactory()
+        for name, params in get_filter_cases():
+            request = factory.get('/api/recipes/', params)
+            request.user = user
+            yield f'recipes: {name}', RecipeFilter(
+                data=request.GET,
+                queryset=Recipe.objects.with_user_flags(user),
+                request=request,
+            ).qs
+        yield 'download_shopping_cart', AmountOfIngridients.objects.filter(
+            recipe__carts__user=user
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(amount_sum=Sum('amount')).order_by('ingredient__name')
+        yield 'subscriptions', User.objects.filter(following__user=user)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True)
+        return queryset.explain()
@@ -0,0 +1,124 @@
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from threading import Lock
+
+from django.db import connections
+
+from foodgram.postgresql.pool import pools
+
+METRICS = {
+    'requests_total': ('counter', 'Число обработанных запросов.'),
+    'db_queries_total': ('counter', 'Число SQL-запросов.'),
+    'db_seconds_total': ('counter', 'Время выполнения SQL-запросов.'),
+    'serialize_seconds_total': (
+        'counter', 'Время serializer.data без SQL-запросов.'
+    ),
+    'render_seconds_total': ('counter', 'Время кодирования ответа в JSON.'),
+    'request_seconds_total': ('counter', 'Полное время обработки запроса.'),
+    'response_bytes_total': ('counter', 'Размер тел ответов.'),
+    'query_budget_exceeded_total': (
+        'counter', 'Число запросов, превысивших бюджет SQL-запросов.'
+    ),
+    'db_queries_max': ('gauge', 'Максимум SQL-запросов на один запрос.'),
+}
+
+DB_METRICS = {
+    'created_total': ('counter', 'Число открытых соединений с БД.'),
+    'size': ('gauge', 'Размер пула соединений.'),
+    'in_use': ('gauge', 'Соединения пула, занятые запросами.'),
+    'idle': ('gauge', 'Свободные соединения пула.'),
+    'checkouts_total': ('counter', 'Число выдач соединений из пула.'),
+    'waits_total': ('counter', 'Выдачи, ждавшие свободного соединения.'),
+    'wait_seconds_total': ('counter', 'Время ожидания соединения из пула.'),
+    'timeouts_total': ('counter', 'Выдачи, не дождавшиеся соединения.'),
+    'discarded_total': ('counter', 'Закрытые пулом сломанные соединения.'),
+}
+
+
+class QueryTimer:
+    """execute_wrapper, считающий SQL-запросы и время их выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+@contextmanager
+def track_queries(timer):
+    """Подключает timer ко всем соединениям с БД текущего потока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield timer
+
+
+class Metrics:
+    """Метрики запросов к API в памяти процесса.
+
+    Каждый воркер gunicorn отдаёт свои значения, поэтому Prometheus
+    должен опрашивать воркеры по отдельности или суммировать ряды.
+    """
+    prefix = 'foodgram'
+
+    def __init__(self):
+        self._lock = Lock()
+        self._values = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, labels, **values):
+        with self._lock:
+            series = self._values[labels]
+            series['requests_total'] += 1
+            for name, value in values.items():
+                if METRICS[name][0] == 'gauge':
+                    series[name] = max(series[name], value)
+                else:
+                    series[name] += value
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        with self._lock:
+            values = {
+                labels: dict(series)
+                for labels, series in self._values.items()
+            }
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for (view, method, status), series in sorted(values.items()):
+                lines.append(
+                    f'{metric}{{view="{view}",method="{method}",'
+                    f'status="{status}"}} {series.get(name, 0):g}'
+                )
+        lines += self.render_pools()
+        return '\n'.join(lines) + '\n'
+
+    def render_pools(self):
+        stats = pools.get_stats()
+        lines = []
+        for name, (kind, description) in DB_METRICS.items():
+            metric = f'{self.prefix}_db_connections_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for alias, values in sorted(stats.items()):
+                if name in values:
+                    lines.append(
+                        f'{metric}{{database="{alias}"}} {values[name]:g}'
+                    )
+        return lines
+
+
+metrics = Metrics()
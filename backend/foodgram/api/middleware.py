@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+
+from api.metrics import QueryTimer, metrics, track_queries
+from foodgram.db_routers import read_replica
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.serialize_duration = 0.0
+        self.render_started = None
+        self.render_duration = 0.0
+
+    @contextmanager
+    def serializing(self):
+        """Время serializer.data без SQL-запросов внутри него."""
+        started = time.perf_counter()
+        queries_duration = self.queries.duration
+        try:
+            yield
+        finally:
+            self.serialize_duration += (
+                time.perf_counter() - started
+                - (self.queries.duration - queries_duration)
+            )
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.finish_render)
+        return response
+
+    def finish_render(self, response):
+        self.render_duration = time.perf_counter() - self.render_started
+
+
+class MetricsMiddleware:
+    """Считает SQL-запросы, время БД, сериализации и рендеринга.
+
+    Сериализация - serializer.data во view (см. SerializationMetricsMixin),
+    рендеринг - кодирование ответа в JSON. Значения отдаются в заголовке
+    Server-Timing и копятся в api.metrics для /api/_metrics. Если view
+    превысил бюджет из QUERY_BUDGETS, пишется предупреждение, а при
+    QUERY_BUDGET_STRICT запрос завершается ошибкой - так бюджеты
+    проверяются в тестах.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics = RequestMetrics()
+        started = time.perf_counter()
+        with track_queries(request.metrics.queries):
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if view == 'metrics':
+            return response
+        if response.streaming:
+            # Запросы потокового ответа выполняются при чтении тела,
+            # уже после возврата из middleware.
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, view,
+                started,
+            )
+            return response
+        duration = time.perf_counter() - started
+        queries = request.metrics.queries
+        serialize = request.metrics.serialize_duration
+        render = request.metrics.render_duration
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={queries.duration * 1000:.1f};'
+            f'desc="{queries.count} queries"',
+            f'app;dur='
+            f'{(duration - queries.duration - serialize - render) * 1000:.1f}',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+        self.observe(request, response, view, duration, len(response.content))
+        return response
+
+    def stream(self, request, response, content, view, started):
+        size, finished = 0, False
+        try:
+            with track_queries(request.metrics.queries):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finished = True
+        finally:
+            # Заголовки уже отправлены, поэтому Server-Timing не ставится,
+            # а оборванный клиентом ответ не завершается ошибкой бюджета.
+            self.observe(
+                request, response, view, time.perf_counter() - started,
+                size, strict=finished,
+            )
+
+    def observe(self, request, response, view, duration, size, strict=True):
+        queries = request.metrics.queries
+        budget = settings.QUERY_BUDGETS.get(
+            f'{request.method} {view}', settings.QUERY_BUDGETS.get(view)
+        )
+        exceeded = budget is not None and queries.count > budget
+        metrics.observe(
+            (view, request.method, response.status_code),
+            db_queries_total=queries.count,
+            db_seconds_total=queries.duration,
+            serialize_seconds_total=request.metrics.serialize_duration,
+            render_seconds_total=request.metrics.render_duration,
+            request_seconds_total=duration,
+            response_bytes_total=size,
+            query_budget_exceeded_total=int(exceeded),
+            db_queries_max=queries.count,
+        )
+        if exceeded:
+            message = (f'{request.method} {view}: {queries.count} '
+                       f'SQL-запросов при бюджете {budget}')
+            if settings.QUERY_BUDGET_STRICT and strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_template_response(self, request, response):
+        return request.metrics.start_render(response)
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтение безопасных запросов в одну случайную реплику.
+
+    После успешного изменяющего запроса клиент на REPLICA_PIN_SECONDS
+    закрепляется за основной БД, чтобы сразу видеть свои изменения:
+    по cookie, а если задан общий для воркеров кеш
+    REPLICA_PIN_CACHE_ALIAS - ещё и по заголовку Authorization.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    @property
+    def cache(self):
+        return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+    def get_pin_key(self, request):
+        # Закрепление в кеше процесса не видно другим воркерам.
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not settings.REPLICA_PIN_CACHE_ALIAS or not authorization:
+            return None
+        digest = hashlib.md5(authorization.encode()).hexdigest()
+        return f'db:pin:{digest}'
+
+    def is_pinned(self, request):
+        try:
+            until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            until = 0
+        if until > time.time():
+            return True
+        key = self.get_pin_key(request)
+        return key is not None and bool(self.cache.get(key))
+
+    def pin(self, request, response):
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE, f'{time.time() + seconds:.3f}',
+            max_age=seconds, httponly=True, samesite='Lax',
+        )
+        key = self.get_pin_key(request)
+        if key is not None:
+            self.cache.set(key, True, seconds)
+
+    def __call__(self, request):
+        safe = request.method in self.safe_methods
+        replica = None
+        if safe and not self.is_pinned(request):
+            replica = random.choice(settings.DATABASE_REPLICAS)
+        token = read_replica.set(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_replica.reset(token)
+        if not safe and response.status_code < 400:
+            self.pin(request, response)
+        return response
@@ -0,0 +1,132 @@
+from calendar import timegm
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from api.serializers import BatchIdsSerializer
+from recipes.counters import delete_counted, refresh_counter
+
+
+class SerializationMetricsMixin:
+    """Замеряет serializer.data для MetricsMiddleware.
+
+    Данные сериализатора кэшируются в нём самом, поэтому их можно
+    получить заранее: для чтения - сразу в get_serializer, для записи -
+    после сохранения.
+    """
+
+    def serialize(self, serializer):
+        request_metrics = getattr(self.request, 'metrics', None)
+        if request_metrics is None:
+            return serializer.data
+        with request_metrics.serializing():
+            return serializer.data
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if (args or 'instance' in kwargs) and 'data' not in kwargs:
+            self.serialize(serializer)
+        return serializer
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.serialize(serializer)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.serialize(serializer)
+
+
+class CatalogMixin:
+    """Отдаёт справочник из recipes.catalog с ETag и Last-Modified."""
+    catalog = None
+
+    def get_catalog_items(self):
+        return self.catalog.all()
+
+    def catalog_response(self, request, get_data):
+        snapshot = self.catalog.snapshot()
+        last_modified = timegm(snapshot.last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=snapshot.etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(get_data())
+        response['ETag'] = snapshot.etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request,
+            lambda: self.get_serializer(
+                self.get_catalog_items(), many=True
+            ).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        instance = self.catalog.get(int(pk)) if pk.isdigit() else None
+        if instance is None:
+            raise Http404
+        return self.catalog_response(
+            request, lambda: self.get_serializer(instance).data
+        )
+
+
+class BatchRelationMixin:
+    """Пакетное добавление и удаление связей пользователя с объектами.
+
+    Связь - модель с полями user и field (Favorite, Cart, Follow).
+    Ответ содержит статус для каждого id в порядке запроса.
+    """
+
+    def batch_relation(self, request, model, field, forbidden=()):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        user = request.user
+        target = model._meta.get_field(field).related_model
+        linked = dict(target.objects.filter(pk__in=ids).annotate(
+            linked=Exists(model.objects.filter(
+                user=user, **{field: OuterRef('pk')}
+            ))
+        ).values_list('pk', 'linked'))
+        if request.method == 'POST':
+            changed = [
+                pk for pk in ids
+                if pk in linked and not linked[pk] and pk not in forbidden
+            ]
+            statuses = ('created', 'exists')
+        else:
+            changed = [pk for pk in ids if linked.get(pk)]
+            statuses = ('deleted', 'not_added')
+        with transaction.atomic():
+            if request.method == 'POST':
+                model.objects.bulk_create(
+                    [model(user=user, **{f'{field}_id': pk})
+                     for pk in changed],
+                    ignore_conflicts=True,
+                )
+            else:
+                # Один DELETE без выборки строк и сигналов на каждую:
+                # счётчики ниже пересчитываются одним UPDATE.
+                delete_counted(model.objects.filter(
+                    user=user, **{f'{field}_id__in': changed}
+                ))
+            if changed:
+                refresh_counter(model, changed)
+        results = []
+        for pk in ids:
+            if pk not in linked:
+                result = 'not_found'
+            elif pk in forbidden:
+                result = 'forbidden'
+            else:
+                result = statuses[pk not in changed]
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results})
@@ -1,8 +1,163 @@
-from rest_framework.pagination import PageNumberPagination
+import json
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor, CursorPagination, PageNumberPagination,
+)
+
+from api.filters import RECIPE_ORDERINGS
+from recipes.models import Recipe
+from recipes.paginator import EstimatedCountPaginator, IdCountPaginator
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинация по составному ключу без COUNT(*) и OFFSET.
+
+    Курсор хранит значения всех полей сортировки последней (или первой)
+    строки страницы, а сортировка всегда заканчивается уникальным id,
+    поэтому строки с одинаковым значением первого поля не теряются и
+    не повторяются. Для рецептов учитывает ?ordering= из
+    RECIPE_ORDERINGS.
+    """
+    ordering = '-id'
+    page_size = settings.MAX_PAGE_SIZE
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        if queryset.model is Recipe:
+            ordering = RECIPE_ORDERINGS.get(
+                request.query_params.get('ordering'), (self.ordering,)
+            )
+        else:
+            ordering = super().get_ordering(request, queryset, view)
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering = (*ordering, '-id')
+        return tuple(ordering)
+
+    def get_fields(self, queryset):
+        opts = queryset.model._meta
+        return [
+            opts.pk if name.lstrip('-') == 'pk'
+            else opts.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    def encode_position(self, item):
+        return json.dumps([
+            field.value_to_string(item) for field in self.fields
+        ])
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_keyset_filter(self, values, reverse):
+        """Строки строго после values в порядке сортировки."""
+        condition, equal = Q(), Q()
+        for name, field, value in zip(self.ordering, self.fields, values):
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field.attname}__{lookup}': value})
+            equal &= Q(**{field.attname: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = self.get_fields(queryset)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor else None
+        if reverse:
+            queryset = queryset.order_by(*(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                self.decode_position(position), reverse
+            ))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_link(self, reverse):
+        if self.page:
+            item = self.page[0] if reverse else self.page[-1]
+            position = self.encode_position(item)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=reverse, position=position)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link(reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link(reverse=True)
 
 
 class Pagination(PageNumberPagination):
+    """Постраничная пагинация с переключением в режим курсора.
+
+    Режим курсора включается параметром ?pagination=cursor (или
+    наличием ?cursor=) и отдаёт только next/previous/results.
+    При PAGINATION_ESTIMATED_COUNT count больших выборок берётся из
+    оценки планировщика PostgreSQL.
+    """
+    django_paginator_class = (
+        EstimatedCountPaginator if settings.PAGINATION_ESTIMATED_COUNT
+        else IdCountPaginator
+    )
     page_size = settings.MAX_PAGE_SIZE
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    keyset_pagination_class = KeysetPagination
+
+    def __init__(self):
+        self.keyset = None
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import transaction
 from django.forms import CharField, EmailField
@@ -8,11 +9,55 @@ from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 from drf_extra_fields.fields import Base64ImageField
 
 from users.models import Follow, User
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.images import get_image_size, is_rendition_ready
 from recipes.models import (
     AmountOfIngridients, Cart, Favorite, Ingredient, Recipe, Tag,
 )
 
 
+class CatalogPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, ищущий объекты в recipes.catalog."""
+
+    def __init__(self, catalog, **kwargs):
+        self.catalog = catalog
+        kwargs.setdefault('queryset', catalog.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.catalog.get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class ImageRenditionField(serializers.ReadOnlyField):
+    """URL миниатюры рецепта; пока она не готова - URL оригинала."""
+
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if is_rendition_ready(recipe, self.rendition):
+            image = getattr(recipe, self.rendition)
+        elif recipe.image:
+            image = recipe.image
+        else:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return image.url
+        return request.build_absolute_uri(image.url)
+
+
 class IngredientSerializer(ModelSerializer):
     class Meta:
         model = Ingredient
@@ -61,10 +106,14 @@ class TagSerializer(ModelSerializer):
 
 
 class RecipeShortInfoSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(read_only=True)
+    image_thumbnail = ImageRenditionField('image_thumbnail')
+    image_webp = ImageRenditionField('image_webp')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_width', 'image_height',
+                  'image_thumbnail', 'image_webp', 'cooking_time')
 
 
 # Сериализаторы для пользователя
@@ -79,6 +128,9 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed', 'recipes',)
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -87,8 +139,7 @@ class CustomUserSerializer(UserSerializer):
 
 class ResponseSubscribeSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count')
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
@@ -97,18 +148,15 @@ class ResponseSubscribeSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj) -> dict:
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        queryset = obj.recipes.all()
-        if recipes_limit is not None:
-            recipes = queryset[:(int(recipes_limit))]
-        else:
-            recipes = queryset
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if recipes_limit is not None:
+                recipes = recipes[:(int(recipes_limit))]
         return RecipesBriefSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj) -> int:
-        return obj.recipes.all().count()
-
 
 class ReadRecipeSerializer(ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
@@ -120,7 +168,9 @@ class ReadRecipeSerializer(ModelSerializer):
         source='amountingridients',
         read_only=True
     )
-    image = Base64ImageField()
+    image = serializers.ImageField(read_only=True)
+    image_thumbnail = ImageRenditionField('image_thumbnail')
+    image_webp = ImageRenditionField('image_webp')
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited')
     is_in_shopping_cart = serializers.SerializerMethodField(
@@ -129,20 +179,26 @@ class ReadRecipeSerializer(ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time',)
-
-    def is_items_in_the_group(self, obj, model):
+                  'is_in_shopping_cart', 'name', 'image', 'image_width',
+                  'image_height', 'image_thumbnail', 'image_webp', 'text',
+                  'cooking_time',)
+
+    def is_items_in_the_group(self, obj, model, annotation):
+        annotated = getattr(obj, annotation, None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
         return model.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_favorited(self, obj):
-        return self.is_items_in_the_group(obj, Favorite)
+        return self.is_items_in_the_group(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.is_items_in_the_group(obj, Cart)
+        return self.is_items_in_the_group(
+            obj, Cart, 'is_in_shopping_cart'
+        )
 
 
 class WriteRecipeSerializer(ModelSerializer):
@@ -152,8 +208,7 @@ class WriteRecipeSerializer(ModelSerializer):
     ingredients = PostAmountOfIngridientsSerializer(
         many=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all())
+    tags = CatalogPrimaryKeyRelatedField(many=True, catalog=tag_catalog)
     image = Base64ImageField()
     cooking_time = serializers.IntegerField(
         validators=(
@@ -173,43 +228,92 @@ class WriteRecipeSerializer(ModelSerializer):
         )
 
     def to_representation(self, instance):
+        # Перечитываем рецепт с prefetch: иначе каждый ингредиент
+        # ответа - отдельный запрос.
+        instance = Recipe.objects.for_reading(
+            self.context['request'].user
+        ).get(pk=instance.pk)
         serializer = ReadRecipeSerializer(instance, context=self.context)
         return serializer.data
 
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не должны повторяться!'
+            )
+        missing_ids = set(ingredient_ids) - set(
+            ingredient_catalog.get_many(ingredient_ids)
+        )
+        if missing_ids:
+            raise serializers.ValidationError(
+                f'Ингредиенты с id {sorted(missing_ids)} не существуют!'
+            )
+        return ingredients
+
+    def create_ingredients(self, recipe, ingredients):
+        AmountOfIngridients.objects.bulk_create(
+            AmountOfIngridients(
+                recipe=recipe,
+                ingredient_id=ingredient.get('id'),
+                amount=ingredient.get('amount')
+            )
+            for ingredient in ingredients
+        )
+
+    def update_ingredients(self, recipe, ingredients):
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in AmountOfIngridients.objects.filter(recipe=recipe)
+        }
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        AmountOfIngridients.objects.filter(recipe=recipe).exclude(
+            ingredient_id__in=amounts
+        ).delete()
+        AmountOfIngridients.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(recipe, (
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ))
+
     @transaction.atomic
     def create(self, validated_data):
         request = self.context['request'].user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        validated_data['image_width'], validated_data['image_height'] = (
+            get_image_size(validated_data['image'])
+        )
         recipe = Recipe.objects.create(author=request, **validated_data)
         recipe.tags.set(tags)
-        for ingredient in ingredients:
-            AmountOfIngridients.objects.create(
-                recipe=recipe,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
-
+        self.create_ingredients(recipe, ingredients)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        AmountOfIngridients.objects.filter(recipe=instance).delete()
         tags = validated_data.pop('tags')
-        instance.tags.clear()
         instance.tags.set(tags)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_width, instance.image_height = get_image_size(
+                validated_data['image']
+            )
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
-        for ingredient in ingredients:
-            AmountOfIngridients.objects.create(
-                recipe=instance,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
+        self.update_ingredients(instance, ingredients)
         instance.save()
         return instance
 
@@ -305,6 +409,19 @@ class FollowSerializer(serializers.ModelSerializer):
 
 
 class RecipesBriefSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(read_only=True)
+    image_thumbnail = ImageRenditionField('image_thumbnail')
+    image_webp = ImageRenditionField('image_webp')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_width', 'image_height',
+                  'image_thumbnail', 'image_webp', 'cooking_time')
+
+
+class BatchIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from api.cache import followed_authors_cache, recipe_list_cache
+from recipes.catalog import tag_catalog
+from recipes.models import AmountOfIngridients, Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+
+def get_tag_slugs(recipe_id):
+    return set(
+        Tag.objects.filter(recipes=recipe_id).values_list('slug', flat=True)
+    )
+
+
+class RecipeInvalidation:
+    """Сброс кэша списков после коммита, один на транзакцию.
+
+    В каждую карточку рецепта вложены все рецепты его автора, поэтому
+    изменение рецепта затрагивает страницы всех тегов, под которыми
+    встречаются рецепты автора.
+    """
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.authors = set()
+        self.tags = set()
+
+    def __call__(self):
+        self.authors.update(Recipe.objects.filter(
+            pk__in=self.recipe_ids
+        ).values_list('author_id', flat=True))
+        self.tags.update(Tag.objects.filter(
+            recipes__author__in=self.authors
+        ).values_list('slug', flat=True))
+        recipe_list_cache.invalidate(self.authors, self.tags)
+
+    @classmethod
+    def schedule(cls, recipe_ids=(), authors=(), tags=()):
+        # Переиспользуется только callback того же savepoint: он
+        # отменится вместе с текущим savepoint, если тот откатят. None -
+        # блоки atomic(savepoint=False), они откатываются с внешним.
+        connection = transaction.get_connection()
+        savepoints = set(connection.savepoint_ids) - {None}
+        queued = (
+            callback
+            for callback_savepoints, callback in connection.run_on_commit
+            if isinstance(callback, cls)
+            and callback_savepoints - {None} == savepoints
+        )
+        callback = next(queued, None)
+        is_new = callback is None
+        if is_new:
+            callback = cls()
+        callback.recipe_ids.update(recipe_ids)
+        callback.authors.update(authors)
+        callback.tags.update(tags)
+        if is_new:
+            transaction.on_commit(callback)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    RecipeInvalidation.schedule(authors=(instance.author_id,))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(instance, **kwargs):
+    # После удаления связи с тегами исчезнут, а страницы тегов, где
+    # был только этот рецепт автора, тоже нужно сбросить.
+    RecipeInvalidation.schedule(
+        authors=(instance.author_id,), tags=get_tag_slugs(instance.pk)
+    )
+
+
+@receiver((post_save, post_delete), sender=AmountOfIngridients)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    RecipeInvalidation.schedule(recipe_ids=(instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action.startswith('post_'):
+            transaction.on_commit(
+                lambda: recipe_list_cache.invalidate(everything=True)
+            )
+        return
+    if action == 'pre_clear':
+        tags = get_tag_slugs(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        tags = {tag.slug for tag in tag_catalog.get_many(pk_set).values()}
+    else:
+        return
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate((instance.author_id,), tags)
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_catalogs(**kwargs):
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate(everything=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(created, update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate(everything=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_followed_authors(instance, **kwargs):
+    transaction.on_commit(
+        lambda: followed_authors_cache.invalidate(instance.user_id)
+    )
@@ -0,0 +1,689 @@
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, connections, router
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.cache import followed_authors_cache
+from api.metrics import metrics
+from api.middleware import QueryBudgetExceeded, ReplicaRoutingMiddleware
+from api.pagination import KeysetPagination
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.counters import delete_counted
+from recipes.images import get_rendition_name
+from recipes.models import (
+    AmountOfIngridients, Cart, Favorite, Ingredient, Recipe, Tag,
+)
+from users.models import Follow, User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAA'
+    'ACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-default',
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-recipes',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-catalog',
+    },
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-feed',
+    },
+}
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password',
+    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeAPITestCase(APITestCase):
+    recipes_total = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(4)]
+        cls.user = cls.users[0]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(40)
+        ]
+        cls.recipes = []
+        for number in range(cls.recipes_total):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % len(cls.users)],
+                name=f'Рецепт {number}',
+                text='Текст',
+                cooking_time=1 + number % 7,
+            )
+            recipe.tags.set(cls.tags[:1 + number % len(cls.tags)])
+            AmountOfIngridients.objects.bulk_create(
+                AmountOfIngridients(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + shift) % 40],
+                    amount=shift + 1,
+                )
+                for shift in range(3)
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3 == 0:
+                Cart.objects.create(user=cls.user, recipe=recipe)
+            cls.recipes.append(recipe)
+        Follow.objects.create(user=cls.user, author=cls.users[1])
+        Follow.objects.create(user=cls.user, author=cls.users[2])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.anonymous = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+
+class RecipeQueryCountTests(RecipeAPITestCase):
+    """Число SQL-запросов не зависит от размера страницы."""
+
+    def assert_list_queries(self, client, queries):
+        url = reverse('recipes-list')
+        for limit in (1, 30):
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_authenticated(self):
+        self.assert_list_queries(self.client, 7)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(self.anonymous, 6)
+
+    def test_detail(self):
+        url = reverse('recipes-detail', args=(self.recipes[0].pk,))
+        for client, queries in ((self.client, 6), (self.anonymous, 5)):
+            with self.assertNumQueries(queries):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class RecipeTagFilterTests(RecipeAPITestCase):
+    """Фильтр по тегам не дублирует рецепты и не добавляет запросов."""
+
+    def get_expected(self, slugs, tags_match, author):
+        queryset = Recipe.objects.filter(
+            author=author, favorites__user=self.user
+        )
+        if tags_match == 'all':
+            for slug in slugs:
+                queryset = queryset.filter(tags__slug=slug)
+        else:
+            queryset = queryset.filter(tags__slug__in=slugs)
+        return set(queryset.values_list('pk', flat=True))
+
+    def test_tags_with_other_filters(self):
+        # Теги берутся из каталога, восьмой запрос — проверка автора.
+        tag_catalog.all()
+        url = reverse('recipes-list')
+        for tags_match, slugs in (
+            ('any', ['tag0', 'tag1', 'tag2']),
+            ('any', ['tag1', 'tag2']),
+            ('all', ['tag0', 'tag1']),
+            ('all', ['tag0', 'tag1', 'tag2']),
+        ):
+            params = {
+                'tags': slugs, 'tags_match': tags_match, 'is_favorited': 1,
+                'author': self.users[1].pk,
+            }
+            expected = self.get_expected(slugs, tags_match, self.users[1])
+            self.assertTrue(expected)
+            for limit in (1, 30):
+                with self.subTest(tags_match=tags_match, slugs=slugs,
+                                  limit=limit), self.assertNumQueries(8):
+                    response = self.client.get(url, {**params,
+                                                     'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                ids = [recipe['id'] for recipe in response.data['results']]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(response.data['count'], len(expected))
+                if limit == 30:
+                    self.assertEqual(set(ids), expected)
+
+
+class RecipeListCacheTests(RecipeAPITestCase):
+    """Кэш анонимного списка сбрасывается при изменениях рецептов."""
+
+    def get_list(self, params):
+        response = self.anonymous.get(
+            reverse('recipes-list'), {**params, 'limit': 30}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assert_cache_is_fresh(self, params, change):
+        cached = self.get_list(params)
+        self.assertEqual(self.get_list(params), cached)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        data = self.get_list(params)
+        caches['recipes'].clear()
+        self.assertEqual(data, self.get_list(params))
+        self.assertNotEqual(data, cached)
+
+    def test_new_recipe_updates_pages_of_other_tags(self):
+        # На странице tag2 есть рецепты users[2]: в них вложен список
+        # его рецептов, куда попадает и новый рецепт с tag0.
+        def change():
+            recipe = Recipe.objects.create(
+                author=self.users[2], name='Новый', text='Текст',
+                cooking_time=1,
+            )
+            recipe.tags.set(self.tags[:1])
+
+        self.assert_cache_is_fresh({'tags': 'tag2'}, change)
+
+    def test_deleted_recipe_updates_pages_of_other_tags(self):
+        recipe = Recipe.objects.filter(
+            author=self.users[1], tags__slug='tag0'
+        ).exclude(tags__slug='tag2').first()
+        self.assert_cache_is_fresh({'tags': 'tag2'}, recipe.delete)
+
+    def test_ingredient_amount_change(self):
+        row = AmountOfIngridients.objects.filter(
+            recipe=self.recipes[-1]
+        ).first()
+
+        def change():
+            row.amount = 999
+            row.save()
+
+        self.assert_cache_is_fresh({}, change)
+
+    def test_ingredient_amount_delete(self):
+        row = AmountOfIngridients.objects.filter(
+            recipe=self.recipes[-1]
+        ).first()
+        self.assert_cache_is_fresh({}, row.delete)
+
+    def test_one_callback_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            AmountOfIngridients.objects.filter(
+                recipe=self.recipes[-1]
+            ).delete()
+            self.recipes[-1].save()
+        self.assertEqual(len(callbacks), 1)
+
+
+# Курсор DRF с позицией по одному полю зацикливается, когда строк
+# с одинаковым значением больше offset_cutoff; маленький cutoff
+# воспроизводит это на тестовых данных.
+@mock.patch.object(KeysetPagination, 'offset_cutoff', 2)
+class KeysetPaginationTests(RecipeAPITestCase):
+    """Курсор проходит выборку целиком, без потерь и повторов."""
+
+    def walk(self, response, link='next'):
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if not response.data[link]:
+                return ids, response
+            response = self.client.get(response.data[link])
+
+    def test_every_recipe_once_in_every_ordering(self):
+        # У рецептов много одинаковых favorites_count и cooking_time.
+        url = reverse('recipes-list')
+        expected = [recipe.pk for recipe in self.recipes]
+        for ordering in ('', 'popular', 'recent', 'quick'):
+            with self.subTest(ordering=ordering):
+                ids, last = self.walk(self.client.get(url, {
+                    'pagination': 'cursor', 'limit': 3,
+                    'ordering': ordering,
+                }))
+                self.assertCountEqual(ids, expected)
+                backward, _ = self.walk(
+                    self.client.get(last.data['previous']), 'previous'
+                )
+                last_ids = [recipe['id'] for recipe in last.data['results']]
+                self.assertCountEqual(backward + last_ids, expected)
+
+    def test_feed(self):
+        authors = (self.users[1].pk, self.users[2].pk)
+        expected = [
+            recipe.pk for recipe in self.recipes
+            if recipe.author_id in authors
+        ]
+        for ordering in ('popular', 'quick'):
+            with self.subTest(ordering=ordering):
+                ids, _ = self.walk(self.client.get(
+                    reverse('recipes-feed'),
+                    {'limit': 2, 'ordering': ordering},
+                ))
+                self.assertCountEqual(ids, expected)
+
+
+class BatchRelationTests(RecipeAPITestCase):
+    """Пакетные эндпоинты держат счётчики в согласии со строками."""
+
+    def assert_counters(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.favorites_count, recipe.favorites.count())
+            self.assertEqual(recipe.in_carts_count, recipe.carts.count())
+        for user in User.objects.all():
+            self.assertEqual(user.followers_count, user.following.count())
+
+    def test_batch_add_and_remove(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes[:6]]
+        missing = max(recipe.pk for recipe in self.recipes) + 1
+        for name in ('favorite-batch', 'shopping-cart-batch'):
+            url = reverse(f'recipes-{name}')
+            with self.subTest(endpoint=name):
+                response = self.client.post(
+                    url, {'ids': recipe_ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assert_counters()
+                response = self.client.delete(
+                    url, {'ids': [*recipe_ids, missing]}, format='json'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [result['status'] for result in response.data['results']],
+                    ['deleted'] * len(recipe_ids) + ['not_found'],
+                )
+                self.assert_counters()
+
+    def test_batch_subscribe_and_unsubscribe(self):
+        url = reverse('follow-subscribe-batch')
+        author_ids = [user.pk for user in self.users]
+        response = self.client.post(url, {'ids': author_ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['forbidden', 'exists', 'exists', 'created'],
+        )
+        self.assert_counters()
+        response = self.client.delete(url, {'ids': author_ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['forbidden', 'deleted', 'deleted', 'deleted'],
+        )
+        self.assert_counters()
+
+
+class ImageRenderingTests(RecipeAPITestCase):
+    """Список отдаёт URL и размеры картинок, не открывая файлы."""
+
+    def setUp(self):
+        super().setUp()
+        for number, recipe in enumerate(self.recipes):
+            recipe.image.name = f'recipes/image{number}.png'
+            recipe.image_width, recipe.image_height = 640, 480
+            if number % 2:
+                for field in ('image_thumbnail', 'image_webp'):
+                    getattr(recipe, field).name = get_rendition_name(
+                        recipe.pk, recipe.image.name, field
+                    )
+        Recipe.objects.bulk_update(self.recipes, (
+            'image', 'image_width', 'image_height', 'image_thumbnail',
+            'image_webp',
+        ))
+
+    def test_list_does_not_open_images(self):
+        error = AssertionError('Файл картинки открыт при выводе списка')
+        with mock.patch.object(FieldFile, 'open', side_effect=error), \
+                mock.patch.object(FileSystemStorage, 'open',
+                                  side_effect=error):
+            for client in (self.client, self.anonymous):
+                response = client.get(reverse('recipes-list'), {'limit': 6})
+                self.assertEqual(response.status_code, 200)
+                for recipe in response.data['results']:
+                    self.assertTrue(recipe['image'])
+                    self.assertEqual(recipe['image_width'], 640)
+                    self.assertTrue(recipe['image_thumbnail'])
+
+
+class RecipeWriteTestCase(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def get_payload(self, ingredients_total, offset=0):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 5}
+                for ingredient in self.ingredients[
+                    offset:offset + ingredients_total
+                ]
+            ],
+        }
+
+
+class RecipeWriteQueryCountTests(RecipeWriteTestCase):
+    """Создание и правка рецепта: число запросов не зависит от
+    числа ингредиентов."""
+
+    def setUp(self):
+        super().setUp()
+        tag_catalog.all()
+        ingredient_catalog.all()
+
+    def test_create(self):
+        url = reverse('recipes-list')
+        for ingredients_total in (1, 10, 30):
+            with self.subTest(ingredients=ingredients_total), \
+                    self.assertNumQueries(14):
+                response = self.client.post(
+                    url, self.get_payload(ingredients_total), format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(
+                len(response.data['ingredients']), ingredients_total
+            )
+
+    def test_update(self):
+        recipe = self.recipes[0]
+        recipe.tags.set(self.tags[:2])
+        url = reverse('recipes-detail', args=(recipe.pk,))
+        # Теги не меняются, а каждая правка удаляет и добавляет
+        # ингредиенты (сдвиг чередуется), поэтому набор запросов одинаков.
+        for step, ingredients_total in enumerate((1, 10, 30)):
+            payload = self.get_payload(
+                ingredients_total, offset=0 if step % 2 else 10
+            )
+            with self.subTest(ingredients=ingredients_total), \
+                    self.assertNumQueries(16):
+                response = self.client.patch(url, payload, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                len(response.data['ingredients']), ingredients_total
+            )
+
+
+class ImageSizeTests(RecipeWriteTestCase):
+    """Размеры картинки известны сразу, до генерации миниатюр."""
+
+    def test_create_and_update_set_size(self):
+        response = self.client.post(
+            reverse('recipes-list'), self.get_payload(1), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            (response.data['image_width'], response.data['image_height']),
+            (1, 1),
+        )
+        recipe = self.recipes[0]
+        response = self.client.patch(
+            reverse('recipes-detail', args=(recipe.pk,)),
+            self.get_payload(1), format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.image_width, recipe.image_height), (1, 1))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(RecipeWriteTestCase):
+    """Худшие случаи записи укладываются в QUERY_BUDGETS."""
+
+    def setUp(self):
+        super().setUp()
+        tag_catalog.invalidate()
+        ingredient_catalog.invalidate()
+
+    def test_create_with_many_ingredients(self):
+        response = self.client.post(
+            reverse('recipes-list'), self.get_payload(30), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_everything(self):
+        recipe = self.recipes[0]
+        payload = self.get_payload(30, offset=2)
+        payload['tags'] = [self.tags[2].pk]
+        payload['ingredients'][0]['amount'] = 100
+        response = self.client.patch(
+            reverse('recipes-detail', args=(recipe.pk,)), payload,
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class FollowedAuthorsCacheTests(RecipeAPITestCase):
+    """Подписки ленты кэшируются в общем кэше и сбрасываются после коммита."""
+
+    def get_feed_authors(self):
+        response = self.client.get(reverse('recipes-feed'), {'limit': 40})
+        self.assertEqual(response.status_code, 200)
+        return {recipe['author']['id'] for recipe in response.data['results']}
+
+    def test_subscribe_updates_feed(self):
+        self.assertEqual(
+            self.get_feed_authors(), {self.users[1].pk, self.users[2].pk}
+        )
+        key = followed_authors_cache.make_key(self.user.pk)
+        self.assertIsNotNone(caches['feed'].get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('follow-subscribe', args=(self.users[3].pk,))
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(caches['feed'].get(key))
+        self.assertEqual(self.get_feed_authors(), {
+            self.users[1].pk, self.users[2].pk, self.users[3].pk,
+        })
+
+
+class RequestMetricsTests(RecipeAPITestCase):
+    """Метрики запроса: сериализация и потоковые ответы."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def get_series(self, view, method='GET', status=200):
+        return metrics._values[(view, method, status)]
+
+    def test_serialization_is_timed(self):
+        response = self.client.get(reverse('recipes-list'), {'limit': 30})
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        series = self.get_series('recipes-list')
+        self.assertGreater(series['serialize_seconds_total'], 0)
+        self.assertGreater(series['render_seconds_total'], 0)
+
+    def test_streaming_queries_are_counted(self):
+        url = reverse('recipes-download-shopping-cart')
+        response = self.client.get(url)
+        self.assertEqual(self.get_series('recipes-download-shopping-cart'),
+                         {})
+        content = b''.join(response.streaming_content)
+        series = self.get_series('recipes-download-shopping-cart')
+        self.assertEqual(series['requests_total'], 1)
+        self.assertEqual(series['response_bytes_total'], len(content))
+        # Токен с пользователем и выборка ингредиентов при чтении тела.
+        self.assertEqual(series['db_queries_total'], 2)
+
+    @override_settings(QUERY_BUDGET_STRICT=True, QUERY_BUDGETS={
+        'recipes-download-shopping-cart': 1,
+    })
+    def test_streaming_budget(self):
+        response = self.client.get(
+            reverse('recipes-download-shopping-cart')
+        )
+        with self.assertRaises(QueryBudgetExceeded):
+            b''.join(response.streaming_content)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentRelationTests(TransactionTestCase):
+    """Параллельные добавления и удаления одной связи."""
+    threads = 8
+
+    def setUp(self):
+        author = create_user(0)
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=1
+        )
+        self.users = [create_user(number) for number in range(1, 3)]
+        self.tokens = [Token.objects.create(user=user) for user in self.users]
+
+    def run_parallel(self, method, url, token):
+        barrier = threading.Barrier(self.threads)
+        statuses = []
+
+        def request():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            try:
+                barrier.wait()
+                statuses.append(getattr(client, method)(url).status_code)
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=request) for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return Counter(statuses)
+
+    def test_same_relation_from_many_threads(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite не допускает параллельной записи.')
+        for name, model, field in (
+            ('favorite', Favorite, 'favorites_count'),
+            ('shopping_cart', Cart, 'in_carts_count'),
+        ):
+            url = reverse(f'recipes-{name.replace("_", "-")}',
+                          args=(self.recipe.pk,))
+            with self.subTest(relation=name):
+                for token in self.tokens:
+                    self.assertEqual(
+                        self.run_parallel('post', url, token),
+                        {201: 1, 400: self.threads - 1},
+                    )
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, field), 2)
+                self.assertEqual(getattr(self.recipe, field),
+                                 model.objects.count())
+                self.assertEqual(
+                    self.run_parallel('delete', url, self.tokens[0]),
+                    {204: 1, 400: self.threads - 1},
+                )
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, field), 1)
+                self.assertEqual(getattr(self.recipe, field),
+                                 model.objects.count())
+
+    def test_delete_counted_is_safe_for_relations(self):
+        # delete_counted пропускает каскады: на связи не должны ссылаться
+        # другие модели.
+        for model in (Favorite, Cart, Follow):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model._meta.related_objects, ())
+        Favorite.objects.create(user=self.users[0], recipe=self.recipe)
+        queryset = Favorite.objects.filter(recipe=self.recipe)
+        self.assertEqual(delete_counted(queryset), 1)
+        self.assertEqual(delete_counted(queryset), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'],
+                   REPLICA_PIN_CACHE_ALIAS=None)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Реплика выбирается один раз на запрос, запись закрепляет клиента."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.reads = []
+        self.middleware = ReplicaRoutingMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.reads.append([
+            router.db_for_read(model) for model in (Recipe, Tag, User) * 3
+        ])
+        return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+    def test_one_replica_per_request(self):
+        for _ in range(20):
+            self.middleware(self.factory.get('/api/recipes/'))
+        for reads in self.reads:
+            self.assertEqual(len(set(reads)), 1)
+            self.assertIn(reads[0], ('replica_1', 'replica_2'))
+        self.assertEqual(
+            {reads[0] for reads in self.reads}, {'replica_1', 'replica_2'}
+        )
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+
+    def test_write_pins_client_by_cookie(self):
+        response = self.middleware(self.factory.post('/api/recipes/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        self.middleware(request)
+        self.middleware(self.factory.get('/api/recipes/'))
+        self.assertEqual(set(self.reads[0]), {'default'})
+        self.assertEqual(set(self.reads[1]), {'default'})
+        self.assertNotEqual(set(self.reads[2]), {'default'})
+
+    def test_token_pin_needs_shared_cache(self):
+        authorization = {'HTTP_AUTHORIZATION': 'Token key'}
+        self.middleware(self.factory.post('/api/recipes/', **authorization))
+        self.middleware(self.factory.get('/api/recipes/', **authorization))
+        self.assertNotEqual(set(self.reads[1]), {'default'})
+        with override_settings(REPLICA_PIN_CACHE_ALIAS='default'):
+            caches['default'].clear()
+            self.middleware(self.factory.post('/api/recipes/',
+                                              **authorization))
+            self.middleware(self.factory.get('/api/recipes/',
+                                             **authorization))
+        self.assertEqual(set(self.reads[3]), {'default'})
@@ -5,7 +5,8 @@ from api.views import (
     CustomUserViewSet,
     IngredientViewSet,
     RecipeViewSet,
-    TagViewSet
+    TagViewSet,
+    metrics_view
 )
 
 
@@ -18,6 +19,7 @@ v1_router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 
 urlpatterns = [
+    path('_metrics', metrics_view, name='metrics'),
     path('', include(v1_router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
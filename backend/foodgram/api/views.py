@@ -1,5 +1,8 @@
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Prefetch, Subquery, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
@@ -7,21 +10,30 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api.cache import followed_authors_cache, recipe_list_cache
+from api.exporters import EXPORTERS, ExportContentNegotiation
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import Pagination
+from api.metrics import metrics
+from api.mixins import (
+    BatchRelationMixin, CatalogMixin, SerializationMetricsMixin,
+)
+from api.pagination import KeysetPagination, Pagination
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
     FollowSerializer, IngredientSerializer, ReadRecipeSerializer,
     RecipeShortInfoSerializer, ResponseSubscribeSerializer, TagSerializer,
     WriteRecipeSerializer,
 )
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.counters import delete_counted, refresh_counter
 from recipes.models import (
     AmountOfIngridients, Cart, Favorite, Ingredient, Recipe, Tag,
 )
 from users.models import Follow, User
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(SerializationMetricsMixin, BatchRelationMixin,
+                        UserViewSet):
     pagination_class = Pagination
 
     @action(
@@ -42,7 +54,8 @@ class CustomUserViewSet(UserViewSet):
             serializer.save()
             serializer = ResponseSubscribeSerializer(
                 author, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(self.serialize(serializer),
+                            status=status.HTTP_201_CREATED)
         follow = Follow.objects.filter(user=user, author=author)
         if not follow.exists():
             return Response(
@@ -52,6 +65,23 @@ class CustomUserViewSet(UserViewSet):
         follow.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='subscribe',
+        url_name='subscribe-batch',
+        permission_classes=(IsAuthenticated,),
+    )
+    def subscribe_batch(self, request):
+        response = self.batch_relation(
+            request, Follow, 'author', forbidden={request.user.pk}
+        )
+        user_id = request.user.pk
+        transaction.on_commit(
+            lambda: followed_authors_cache.invalidate(user_id)
+        )
+        return response
+
     @action(
         detail=False,
         methods=('GET',),
@@ -61,34 +91,54 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is not None and recipes_limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(recipes_limit)]
+            ))
+        queryset = User.objects.filter(
+            following__user=user
+        ).with_is_subscribed(user).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by(*User._meta.ordering)
         pages = self.paginate_queryset(queryset)
         serializer = ResponseSubscribeSerializer(
             pages,
             many=True,
             context={'request': request}
         )
-        return self.get_paginated_response(serializer.data)
+        return self.get_paginated_response(self.serialize(serializer))
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(SerializationMetricsMixin, CatalogMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
+    catalog = tag_catalog
     serializer_class = TagSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SerializationMetricsMixin, CatalogMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
+    catalog = ingredient_catalog
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny, )
     filter_backends = (IngredientFilter,)
-    search_fields = ('name',)
     pagination_class = None
 
+    def get_catalog_items(self):
+        if self.request.query_params.get(IngredientFilter.search_param):
+            return self.filter_queryset(self.get_queryset())
+        return super().get_catalog_items()
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+
+class RecipeViewSet(SerializationMetricsMixin, BatchRelationMixin,
+                    viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
@@ -96,27 +146,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = Pagination
     filterset_fields = ('tags', 'author',)
 
+    def get_queryset(self):
+        if self.action not in ('list', 'retrieve', 'feed'):
+            return Recipe.objects.all()
+        return Recipe.objects.for_reading(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        key = recipe_list_cache.make_key(request)
+        data = recipe_list_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        recipe_list_cache.set(key, response.data)
+        return response
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return ReadRecipeSerializer
         return WriteRecipeSerializer
 
     def add_recipe(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
+            # Повторное добавление отсекает unique-ограничение,
+            # поэтому одновременные запросы не приводят к 500.
             return Response(
                 {'errors': f'Рецепт уже добавлен в {model.__name__}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        recipe = get_object_or_404(Recipe, pk=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = RecipeShortInfoSerializer(recipe)
-        return Response(serializer.data,
+        return Response(self.serialize(serializer),
                         status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        # Решение принимается по числу удалённых строк, а счётчик
+        # пересчитывается, только если строка была удалена.
+        if delete_counted(model.objects.filter(user=user, recipe_id=pk)):
+            refresh_counter(model, (pk,))
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': f'Рецепт не добавлен в {model.__name__}'},
@@ -145,22 +216,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-batch',
         permission_classes=[IsAuthenticated, ]
     )
+    def favorite_batch(self, request):
+        return self.batch_relation(request, Favorite, 'recipe')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_relation(request, Cart, 'recipe')
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ],
+        pagination_class=KeysetPagination,
+    )
+    def feed(self, request):
+        queryset = self.get_queryset().filter(
+            author_id__in=followed_authors_cache.get(request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ],
+        content_negotiation_class=ExportContentNegotiation,
+    )
     def download_shopping_cart(self, request):
+        file_format = request.query_params.get('format', 'txt')
+        exporter = EXPORTERS.get(file_format)
+        if exporter is None:
+            return Response(
+                {'errors': f'Формат {file_format} не поддерживается, '
+                           f'доступны: {", ".join(EXPORTERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         ingredients = AmountOfIngridients.objects.filter(
             recipe__carts__user=request.user
-        ).values(
+        ).values_list(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount')).order_by()
-        shopping_list = ['Список покупок:\n']
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['ingredient_amount']
-            shopping_list.append(f'\n{name} - {amount}, {unit}')
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = \
-            'attachment; filename="shopping_cart.txt"'
+        ).annotate(
+            ingredient_amount=Sum('amount')
+        ).order_by('ingredient__name').iterator(
+            chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+        )
+        response = StreamingHttpResponse(
+            exporter().export(ingredients),
+            content_type=exporter.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{exporter.extension}"'
+        )
         return response
+
+
+def metrics_view(request):
+    """Метрики API в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,33 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Реплика, выбранная ReplicaRoutingMiddleware на весь запрос: все чтения
+# запроса видят один снимок данных. Вне запросов чтение идёт в default.
+read_replica = ContextVar('read_replica', default=None)
+
+
+class ReplicaRouter:
+    """Отправляет чтение в реплики из DATABASE_REPLICAS, запись - в default.
+
+    Чтение идёт в реплику из read_replica, если она выбрана.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_replica.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        # Явный default: иначе Django пишет в БД, из которой прочитан
+        # объект, то есть в реплику.
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,87 @@
+from django.db.backends.postgresql import base
+
+from .pool import ConnectionPool, pools
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой соединений и пулом внутри процесса.
+
+    CONN_HEALTH_CHECKS: постоянное соединение проверяется SELECT 1 перед
+    первым обращением в каждом запросе и при ошибке переоткрывается.
+    POOL = {'SIZE': ..., 'TIMEOUT': ...} с SIZE > 0 включает пул, общий
+    для потоков процесса: закрытое соединение возвращается в пул.
+    """
+    health_check_done = False
+    pool = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if options.get('SIZE', 0) <= 0:
+            return None
+        return pools.get_pool(
+            self.alias,
+            repr(sorted(conn_params.items())),
+            lambda: ConnectionPool(
+                options['SIZE'], options.get('TIMEOUT', 30),
+                check=is_usable if self.health_check_enabled else None,
+            ),
+        )
+
+    def create_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pools.connection_created(self.alias)
+        return connection
+
+    def get_new_connection(self, conn_params):
+        # Новое или выданное пулом соединение уже проверено.
+        self.health_check_done = True
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return self.create_connection(conn_params)
+        connection = self.pool.get(
+            lambda: self.create_connection(conn_params)
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.put(self.connection)
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
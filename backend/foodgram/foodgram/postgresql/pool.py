@@ -0,0 +1,152 @@
+import os
+import time
+from collections import defaultdict, deque
+from threading import Condition, Lock
+
+from psycopg2 import Error, OperationalError, extensions
+
+
+class PoolTimeout(OperationalError):
+    """Свободное соединение не появилось за TIMEOUT секунд."""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений psycopg2 не больше size штук.
+
+    Последнее возвращённое соединение выдаётся первым, поэтому в работе
+    остаются «тёплые» соединения.
+    """
+
+    def __init__(self, size, timeout, check=None):
+        self.size = size
+        self.timeout = timeout
+        self.check = check
+        self.idle = deque()
+        self.in_use = 0
+        self.condition = Condition()
+        self.stats = defaultdict(float)
+
+    def is_usable(self, connection):
+        if connection.closed:
+            return False
+        return self.check is None or self.check(connection)
+
+    def get(self, connect):
+        """Соединение из пула; новое открывается вызовом connect()."""
+        started = time.monotonic()
+        with self.condition:
+            self.stats['checkouts_total'] += 1
+            waited = False
+            while not self.idle and self.in_use >= self.size:
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts_total'] += 1
+                    raise PoolTimeout(
+                        f'Нет свободного соединения в пуле из {self.size} '
+                        f'за {self.timeout} с.'
+                    )
+                waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.stats['waits_total'] += 1
+                self.stats['wait_seconds_total'] += (
+                    time.monotonic() - started
+                )
+            self.in_use += 1
+            connection = self.idle.pop() if self.idle else None
+        # Место в пуле уже занято: проверка и подключение идут без
+        # блокировки, чтобы не задерживать другие потоки.
+        try:
+            if connection is not None and not self.is_usable(connection):
+                connection.close()
+                self.count('discarded_total')
+                connection = None
+            if connection is None:
+                connection = connect()
+        except BaseException:
+            self.release(None)
+            raise
+        return connection
+
+    def put(self, connection):
+        """Возвращает соединение в пул, откатив незавершённую транзакцию."""
+        try:
+            status = connection.get_transaction_status()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Error:
+            connection.close()
+        if connection.closed:
+            self.count('discarded_total')
+            connection = None
+        self.release(connection)
+
+    def release(self, connection):
+        with self.condition:
+            self.in_use -= 1
+            if connection is not None:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def count(self, name):
+        with self.condition:
+            self.stats[name] += 1
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                **self.stats,
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+            }
+
+
+class PoolRegistry:
+    """Пулы и счётчики соединений текущего процесса по алиасам БД.
+
+    После fork воркер gunicorn начинает с пустого реестра: соединения
+    родительского процесса не переиспользуются.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pools = {}
+        self._created = defaultdict(int)
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def get_pool(self, alias, key, factory):
+        with self._lock:
+            self._check_pid()
+            pool = self._pools.get((alias, key))
+            if pool is None:
+                self._pools[(alias, key)] = pool = factory()
+            return pool
+
+    def connection_created(self, alias):
+        with self._lock:
+            self._check_pid()
+            self._created[alias] += 1
+
+    def get_stats(self):
+        """{алиас: {метрика: значение}} для соединений без пула и пулов."""
+        with self._lock:
+            self._check_pid()
+            pools = list(self._pools.items())
+            stats = defaultdict(lambda: defaultdict(float))
+            for alias, created in self._created.items():
+                stats[alias]['created_total'] += created
+        for (alias, _), pool in pools:
+            for name, value in pool.snapshot().items():
+                stats[alias][name] += value
+        return {alias: dict(values) for alias, values in stats.items()}
+
+
+pools = PoolRegistry()
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+from psycopg2 import InterfaceError, extensions
+
+from foodgram.postgresql.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, status=extensions.TRANSACTION_STATUS_IDLE):
+        self.closed = 0
+        self.status = status
+        self.rollbacks = 0
+        self.rollback_error = None
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.rollback_error is not None:
+            raise self.rollback_error
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Пул соединений на поддельных соединениях psycopg2."""
+
+    def test_timeout_when_pool_is_full(self):
+        pool = ConnectionPool(1, 0.05)
+        pool.get(FakeConnection)
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.get(FakeConnection)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        stats = pool.snapshot()
+        self.assertEqual(stats['timeouts_total'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_waits_for_returned_connection(self):
+        pool = ConnectionPool(1, 5)
+        connection = pool.get(FakeConnection)
+        timer = threading.Timer(0.05, pool.put, (connection,))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertIs(pool.get(FakeConnection), connection)
+        stats = pool.snapshot()
+        self.assertEqual(stats['waits_total'], 1)
+        self.assertGreater(stats['wait_seconds_total'], 0)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_failed_connect_releases_slot(self):
+        pool = ConnectionPool(1, 0.05)
+
+        def connect():
+            raise InterfaceError('нет соединения')
+
+        with self.assertRaises(InterfaceError):
+            pool.get(connect)
+        self.assertEqual(pool.snapshot()['in_use'], 0)
+        self.assertIsInstance(pool.get(FakeConnection), FakeConnection)
+
+    def test_put_rolls_back_open_transaction(self):
+        pool = ConnectionPool(1, 1)
+        connection = pool.get(FakeConnection)
+        connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.put(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.get(FakeConnection), connection)
+        self.assertNotIn('discarded_total', pool.snapshot())
+
+    def test_put_discards_connection_that_failed_rollback(self):
+        pool = ConnectionPool(1, 1)
+        connection = pool.get(FakeConnection)
+        connection.status = extensions.TRANSACTION_STATUS_INERROR
+        connection.rollback_error = InterfaceError('соединение разорвано')
+        pool.put(connection)
+        self.assertTrue(connection.closed)
+        stats = pool.snapshot()
+        self.assertEqual(stats['discarded_total'], 1)
+        self.assertEqual((stats['idle'], stats['in_use']), (0, 0))
+
+    def test_put_discards_closed_connection(self):
+        pool = ConnectionPool(1, 1)
+        connection = pool.get(FakeConnection)
+        connection.closed = 2
+        pool.put(connection)
+        self.assertEqual(pool.snapshot()['discarded_total'], 1)
+        self.assertIsNot(pool.get(FakeConnection), connection)
+
+    def test_get_discards_unusable_connection(self):
+        broken = set()
+        pool = ConnectionPool(1, 1, check=lambda item: item not in broken)
+        connection = pool.get(FakeConnection)
+        pool.put(connection)
+        broken.add(connection)
+        fresh = pool.get(FakeConnection)
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        stats = pool.snapshot()
+        self.assertEqual(stats['discarded_total'], 1)
+        self.assertEqual(stats['in_use'], 1)
@@ -32,10 +32,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,17 +66,58 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Пул соединений на процесс; 0 - без пула, с постоянными соединениями.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mysecretpassword'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # С пулом соединение возвращается в него после каждого запроса.
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+        ),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host[:port],...
+DATABASE_REPLICAS = []
+
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['foodgram.db_routers.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной БД.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+REPLICA_PIN_COOKIE = 'db_primary_until'
+
+# Кеш для закрепления клиентов без cookie по токену. Должен быть общим
+# для всех воркеров, иначе закрепление видно только одному процессу;
+# по умолчанию закрепление только по cookie.
+REPLICA_PIN_CACHE_ALIAS = os.getenv('REPLICA_PIN_CACHE_ALIAS') or None
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -82,6 +125,52 @@ DATABASES = {
 #     }
 # }
 
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+RECIPE_CACHE_BACKEND = os.getenv('RECIPE_CACHE_BACKEND', 'locmem')
+
+# Версии каталогов должны быть общими для всех воркеров, иначе
+# изменения тегов и ингредиентов видит только один процесс.
+CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', 'file')
+
+# Подписки пользователя сбрасываются воркером, обработавшим изменение,
+# поэтому этот кэш тоже должен быть общим.
+FEED_CACHE_BACKEND = os.getenv('FEED_CACHE_BACKEND', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipes': {
+        'BACKEND': CACHE_BACKENDS.get(
+            RECIPE_CACHE_BACKEND, RECIPE_CACHE_BACKEND
+        ),
+        'LOCATION': os.getenv(
+            'RECIPE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 60)),
+    },
+    'catalog': {
+        'BACKEND': CACHE_BACKENDS.get(
+            CATALOG_CACHE_BACKEND, CATALOG_CACHE_BACKEND
+        ),
+        'LOCATION': os.getenv(
+            'CATALOG_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache', 'catalog'),
+        ),
+    },
+    'feed': {
+        'BACKEND': CACHE_BACKENDS.get(FEED_CACHE_BACKEND, FEED_CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'FEED_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'feed')
+        ),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -155,3 +244,64 @@ DJOSER = {
 }
 
 MAX_PAGE_SIZE = 6
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+CATALOG_CACHE_ALIAS = os.getenv('CATALOG_CACHE_ALIAS', 'catalog')
+
+CATALOG_CACHE_TIMEOUT = 300
+
+RECIPE_LIST_CACHE_ALIAS = 'recipes'
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+IMAGE_THUMBNAIL_SIZE = (320, 320)
+
+IMAGE_WEBP_SIZE = (1280, 1280)
+
+FEED_CACHE_ALIAS = os.getenv('FEED_CACHE_ALIAS', 'feed')
+
+FEED_CACHE_TIMEOUT = 30
+
+BATCH_MAX_SIZE = 100
+
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv('ESTIMATED_COUNT_THRESHOLD', 100000)
+)
+
+PAGINATION_ESTIMATED_COUNT = (
+    os.getenv('PAGINATION_ESTIMATED_COUNT', 'False').lower() == 'true'
+)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+QUERY_BUDGET_STRICT = (
+    os.getenv('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
+)
+
+# POST и PATCH замерены с 30 ингредиентами, сменой тегов и холодным
+# кэшем справочников. У DELETE рецепта бюджета нет: каждая строка
+# избранного и списков покупок удаляется со своим сигналом счётчика.
+QUERY_BUDGETS = {
+    'GET recipes-list': 10,
+    'POST recipes-list': 20,
+    'GET recipes-detail': 10,
+    'PATCH recipes-detail': 24,
+    'recipes-feed': 10,
+    'recipes-favorite': 6,
+    'recipes-shopping-cart': 6,
+    'recipes-favorite-batch': 6,
+    'recipes-shopping-cart-batch': 6,
+    'recipes-download-shopping-cart': 3,
+    'follow-subscriptions': 6,
+    'follow-subscribe': 10,
+    'follow-subscribe-batch': 6,
+    'tags-list': 2,
+    'tags-detail': 2,
+    'ingredients-list': 4,
+    'ingredients-detail': 2,
+}
+
+TEST_RUNNER = 'foodgram.test_runner.NoMigrationsRunner'
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class DisableMigrations:
+    def __contains__(self, app_label):
+        return True
+
+    def __getitem__(self, app_label):
+        return None
+
+
+class NoMigrationsRunner(DiscoverRunner):
+    """Создаёт тестовую БД прямо по моделям.
+
+    Миграции в репозитории не хранятся и генерируются при деплое.
+    """
+
+    def setup_databases(self, **kwargs):
+        settings.MIGRATION_MODULES = DisableMigrations()
+        return super().setup_databases(**kwargs)
@@ -5,15 +5,36 @@ from django.forms import BaseInlineFormSet
 
 from recipes.models import (Favorite, Ingredient, Recipe,
                             AmountOfIngridients, Cart, Tag)
+from recipes.paginator import EstimatedCountPaginator
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist без точных COUNT(*) по большим таблицам."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    related_fields = ()
+
+    def get_queryset(self, request):
+        # __str__ связанных моделей читает внешние ключи: подгружаем
+        # их сразу и в списке, и на страницах объекта.
+        return super().get_queryset(request).select_related(
+            *self.related_fields
+        )
+
+
+class BaseFavAndCartAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    related_fields = ('user', 'recipe')
     empty_value_display = '-empty-'
 
 
+@admin.register(Favorite)
+class FavoriteAdmin(BaseFavAndCartAdmin):
+    pass
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'color', 'slug')
@@ -52,6 +73,10 @@ class IngredientsFormSet(BaseInlineFormSet):
 class RecipeIngredientInline(admin.TabularInline):
     model = AmountOfIngridients
     formset = IngredientsFormSet
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 class TagInline(admin.TabularInline):
@@ -59,28 +84,37 @@ class TagInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'author', 'favorites_amount')
-    search_fields = ('name', 'author')
-    list_filter = ('name', 'author', 'tags')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('pk', 'name', 'author', 'favorites_amount',
+                    'in_carts_amount')
+    search_fields = ('name', 'author__username')
+    list_filter = ('tags',)
     empty_value_display = '-empty-'
     exclude = ('tags',)
+    autocomplete_fields = ('author',)
+    related_fields = ('author',)
     inlines = [
         RecipeIngredientInline, TagInline
     ]
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites_amount(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    @admin.display(description='В списках покупок',
+                   ordering='in_carts_count')
+    def in_carts_amount(self, obj):
+        return obj.in_carts_count
 
 
 @admin.register(Cart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
-    empty_value_display = '-empty-'
+class ShoppingCartAdmin(BaseFavAndCartAdmin):
+    pass
 
 
 @admin.register(AmountOfIngridients)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
+    autocomplete_fields = ('recipe', 'ingredient')
+    related_fields = ('recipe', 'ingredient')
     empty_value_display = '-empty-'
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_indexes(using='default', **kwargs):
+    from recipes.search import create_trigram_index
+
+    create_trigram_index(using)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
+
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,112 @@
+import hashlib
+import time
+import uuid
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from recipes.models import Ingredient, Tag
+
+
+class Snapshot:
+    def __init__(self, version, items, etag, last_modified):
+        self.version = version
+        self.items = items
+        self.by_pk = {item.pk: item for item in items}
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = time.monotonic() + settings.CATALOG_CACHE_TIMEOUT
+
+
+class Catalog:
+    """Кэш справочной таблицы в памяти процесса.
+
+    Снимок таблицы перечитывается, когда меняется токен версии в общем
+    кэше (его обновляют сигналы и load_csv) или истекает
+    CATALOG_CACHE_TIMEOUT.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f'catalog:{model._meta.label_lower}:version'
+        self._snapshot = None
+        self._lock = Lock()
+
+    def __deepcopy__(self, memo):
+        # Каталог общий для процесса: DRF копирует аргументы полей.
+        return self
+
+    @property
+    def cache(self):
+        return caches[settings.CATALOG_CACHE_ALIAS]
+
+    def get_version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        self.cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+
+    def snapshot(self):
+        version = self.get_version()
+        snapshot = self._snapshot
+        if (
+            snapshot is None or snapshot.version != version
+            or snapshot.expires < time.monotonic()
+        ):
+            with self._lock:
+                snapshot = self._snapshot
+                if (
+                    snapshot is None or snapshot.version != version
+                    or snapshot.expires < time.monotonic()
+                ):
+                    snapshot = self.load(version, snapshot)
+                    self._snapshot = snapshot
+        return snapshot
+
+    def load(self, version, previous):
+        items = list(self.model.objects.all())
+        rows = [
+            [getattr(item, field.attname)
+             for field in self.model._meta.concrete_fields]
+            for item in items
+        ]
+        etag = '"{}"'.format(
+            hashlib.md5(repr(rows).encode()).hexdigest()
+        )
+        if previous is not None and previous.etag == etag:
+            last_modified = previous.last_modified
+        else:
+            last_modified = timezone.now().replace(microsecond=0)
+        return Snapshot(version, items, etag, last_modified)
+
+    def all(self):
+        return self.snapshot().items
+
+    def get(self, pk):
+        return self.get_many((pk,)).get(pk)
+
+    def get_many(self, pks):
+        """Возвращает {pk: объект} для найденных pk.
+
+        Промахи проверяются запросом к БД: если объект там есть,
+        снимок устарел и сбрасывается.
+        """
+        by_pk = self.snapshot().by_pk
+        found = {pk: by_pk[pk] for pk in pks if pk in by_pk}
+        missing = set(pks) - set(found)
+        if missing:
+            loaded = self.model.objects.in_bulk(missing)
+            if loaded:
+                self.invalidate()
+                found.update(loaded)
+        return found
+
+
+tag_catalog = Catalog(Tag)
+ingredient_catalog = Catalog(Ingredient)
@@ -0,0 +1,49 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow, User
+
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    Cart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Follow: (User, 'author_id', 'followers_count'),
+}
+
+
+def count_subquery(model, field):
+    """Коррелированный COUNT(*) строк model, ссылающихся на OuterRef pk."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def refresh_counter(source, pks):
+    """Пересчитывает счётчик, который ведёт source, для объектов pks.
+
+    Нужен после bulk-операций: они не отправляют сигналы, поэтому
+    счётчик пересчитывается одним UPDATE по фактическому числу строк.
+    """
+    model, key, field = COUNTERS[source]
+    model.objects.filter(pk__in=pks).update(
+        **{field: count_subquery(source, key)}
+    )
+
+
+def delete_counted(queryset):
+    """Удаляет строки одним DELETE и возвращает их фактическое число.
+
+    QuerySet.delete() сначала выбирает строки и шлёт post_delete для
+    каждой, даже если параллельный запрос успел её удалить, - счётчик
+    уменьшился бы дважды. Приватный _raw_delete выполняет только DELETE;
+    это безопасно для Favorite, Cart и Follow: на них не ссылаются другие
+    модели, а счётчик после удаления пересчитывает refresh_counter.
+    """
+    return queryset._raw_delete(queryset.db)
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+
+RENDITIONS = {
+    'image_thumbnail': {
+        'suffix': '_thumb.jpg',
+        'format': 'JPEG',
+        'size': settings.IMAGE_THUMBNAIL_SIZE,
+        'options': {'quality': 80, 'optimize': True},
+    },
+    'image_webp': {
+        'suffix': '.webp',
+        'format': 'WEBP',
+        'size': settings.IMAGE_WEBP_SIZE,
+        'options': {'quality': 80, 'method': 4},
+    },
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+)
+
+
+def get_rendition_name(recipe_id, image_name, field):
+    """Имя миниатюры, уникальное для пары рецепт - картинка.
+
+    Хэш полного имени различает photo.jpg и photo.png, а id рецепта -
+    рецепты с одной картинкой, поэтому файл не делят два рецепта.
+    """
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    digest = hashlib.md5(image_name.encode()).hexdigest()[:12]
+    return (f'{RENDITIONS_DIR}/{recipe_id}_{stem}_{digest}'
+            f'{RENDITIONS[field]["suffix"]}')
+
+
+def is_rendition_ready(recipe, field):
+    rendition = getattr(recipe, field)
+    return bool(recipe.image) and rendition.name == get_rendition_name(
+        recipe.pk, recipe.image.name, field
+    )
+
+
+def get_image_size(file):
+    """Ширина и высота загруженной картинки.
+
+    Поле картинки DRF оставляет разобранное Pillow изображение в
+    file.image, иначе читается только заголовок файла.
+    """
+    image = getattr(file, 'image', None)
+    if image is not None:
+        return image.size
+    file.seek(0)
+    with Image.open(file) as image:
+        size = image.size
+    file.seek(0)
+    return size
+
+
+def schedule_renditions(recipe):
+    """Ставит генерацию миниатюр в очередь после коммита транзакции."""
+    if not recipe.image or all(
+        is_rendition_ready(recipe, field) for field in RENDITIONS
+    ):
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(build_renditions, recipe_id, image_name)
+    )
+
+
+def render(image, rendition):
+    image = image.copy()
+    image.thumbnail(rendition['size'])
+    if rendition['format'] == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, rendition['format'], **rendition['options'])
+    return ContentFile(buffer.getvalue())
+
+
+def build_renditions(recipe_id, image_name):
+    from recipes.models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).first()
+        if recipe is None or recipe.image.name != image_name:
+            return
+        with default_storage.open(image_name) as file:
+            image = Image.open(file)
+            image.load()
+        for field, rendition in RENDITIONS.items():
+            name = get_rendition_name(recipe_id, image_name, field)
+            # Файл с этим именем принадлежит только этому рецепту.
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            setattr(recipe, field, default_storage.save(
+                name, render(image, rendition)
+            ))
+        update_fields = list(RENDITIONS)
+        # API задаёт размеры при загрузке, здесь они дополняются только
+        # для картинок, загруженных в обход него (админка).
+        if recipe.image_width is None:
+            recipe.image_width, recipe.image_height = image.size
+            update_fields += ['image_width', 'image_height']
+        recipe.save(update_fields=update_fields)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры для %s',
+                         image_name)
+    finally:
+        connections.close_all()
@@ -1,23 +1,182 @@
 import csv
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import recipe_list_cache
+from recipes.catalog import ingredient_catalog
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None
+            continue
+        yield row
+
+
+def read_json(file):
+    """Потоково читает JSON-массив объектов name/measurement_unit."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный или обрезанный JSON.')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        if not isinstance(item, dict):
+            yield None
+            continue
+        yield item.get('name'), item.get('measurement_unit')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def clean_row(row):
+    """Пара (название, единица) без пробелов по краям или None."""
+    if row is None or not all(isinstance(value, str) for value in row):
+        return None
+    name, measurement_unit = (value.strip() for value in row)
+    if not name or not measurement_unit:
+        return None
+    return name, measurement_unit
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
     def add_arguments(self, parser):
         parser.add_argument('path', type=str)
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--update-units', action='store_true',
+            help='Обновлять единицу измерения ингредиента, если он '
+                 'встречается в БД под тем же названием один раз.'
+        )
 
     def handle(self, *args, **options):
         path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format!r}, '
+                f'укажите --format {"|".join(READERS)}.'
+            )
+        self.stats = {'inserted': 0, 'updated': 0, 'skipped': 0,
+                      'invalid': 0}
+        self.seen = set()
+        self.name_counts = Counter()
+        started = time.perf_counter()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            if options['update_units']:
+                # Единица обновляется, только если название встречается
+                # в файле один раз, поэтому файл сначала читается целиком.
+                self.name_counts = self.count_names(
+                    READERS[file_format](file)
+                )
+                file.seek(0)
+            rows = READERS[file_format](file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.load_batch(batch, options['update_units'])
+        # bulk-операции не шлют сигналов, поэтому кэши сбрасываются здесь:
+        # единицы измерения выводятся и в закэшированных списках рецептов.
+        ingredient_catalog.invalidate()
+        recipe_list_cache.invalidate(everything=True)
+        elapsed = time.perf_counter() - started
+        total = sum(self.stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            'Добавлено: {inserted}, обновлено: {updated}, пропущено: '
+            '{skipped}, некорректных строк: {invalid}.'.format(**self.stats)
+        ))
+        self.stdout.write(
+            f'Обработано {total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с).'
+        )
 
-        with open(path, encoding='utf-8') as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
+    def count_names(self, rows):
+        """Сколько разных единиц измерения у каждого названия в файле."""
+        pairs = set(filter(None, map(clean_row, rows)))
+        return Counter(name for name, _ in pairs)
 
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit
-                )
+    def load_batch(self, batch, update_units):
+        pairs = []
+        for row in batch:
+            pair = clean_row(row)
+            if pair is None:
+                self.stats['invalid'] += 1
+                continue
+            if pair in self.seen:
+                self.stats['skipped'] += 1
+                continue
+            self.seen.add(pair)
+            pairs.append(pair)
+        existing = {}
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in={name for name, _ in pairs}
+        ).values_list('pk', 'name', 'measurement_unit'):
+            existing.setdefault(name, {})[measurement_unit] = pk
+        new, changed = [], []
+        for name, measurement_unit in pairs:
+            units = existing.get(name, {})
+            if measurement_unit in units:
+                self.stats['skipped'] += 1
+            elif (
+                update_units and len(units) == 1
+                and self.name_counts[name] == 1
+            ):
+                (pk,) = units.values()
+                changed.append(Ingredient(
+                    pk=pk, name=name, measurement_unit=measurement_unit
+                ))
+            else:
+                new.append(Ingredient(
+                    name=name, measurement_unit=measurement_unit
+                ))
+        Ingredient.objects.bulk_update(changed, ('measurement_unit',))
+        inserted = 0
+        if new:
+            # ignore_conflicts молча пропускает строки, добавленные
+            # параллельно, поэтому вставленные считаются по таблице
+            # непосредственно до и после вставки.
+            names = Ingredient.objects.filter(
+                name__in={ingredient.name for ingredient in new}
+            )
+            before = names.count()
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            inserted = min(len(new), names.count() - before)
+        self.stats['updated'] += len(changed)
+        self.stats['inserted'] += inserted
+        self.stats['skipped'] += len(new) - inserted
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.counters import COUNTERS, count_subquery
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики избранного, '
+            'списков покупок, рецептов и подписчиков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить счётчики, завершиться с ошибкой '
+                 'при расхождениях.'
+        )
+
+    def handle(self, *args, **options):
+        mismatched = 0
+        with transaction.atomic():
+            for source, (model, field, counter) in COUNTERS.items():
+                stale = model.objects.annotate(
+                    actual=count_subquery(source, field)
+                ).filter(~Q(**{counter: F('actual')}))
+                count = stale.count()
+                mismatched += count
+                self.stdout.write(
+                    f'{model.__name__}.{counter}: расхождений {count}'
+                )
+                if count and not options['check']:
+                    model.objects.update(
+                        **{counter: count_subquery(source, field)}
+                    )
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Счётчики в порядке.'))
+        elif options['check']:
+            raise CommandError(f'Найдено расхождений: {mismatched}')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {mismatched}.'
+            ))
@@ -0,0 +1,269 @@
+import os
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.models import (
+    AmountOfIngridients, Cart, Favorite, Ingredient, Recipe, Tag,
+)
+from users.models import Follow, User
+
+INGREDIENTS_CSV = os.path.join(
+    settings.BASE_DIR, 'recipes', 'recipes_db', 'ingredients.csv'
+)
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F9A62B', 'dessert'),
+    ('Выпечка', '#C64E8E', 'bakery'),
+    ('Салат', '#2A9D8F', 'salad'),
+    ('Суп', '#264653', 'soup'),
+    ('Напиток', '#E76F51', 'drink'),
+)
+
+
+class Zipf:
+    """Выбирает элементы population с вероятностью ~ 1 / rank ** s.
+
+    Первый элемент population - самый популярный.
+    """
+
+    def __init__(self, rand, population, exponent):
+        self.rand = rand
+        self.population = population
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(population) + 1)
+        ))
+
+    def choice(self):
+        return self.choices(1)[0]
+
+    def choices(self, k):
+        return self.rand.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+    def distinct(self, k):
+        """k разных элементов; популярные выпадают чаще."""
+        k = min(k, len(self.population))
+        chosen = dict.fromkeys(self.choices(k))
+        for _ in range(10):
+            if len(chosen) >= k:
+                break
+            chosen.update(dict.fromkeys(self.choices(k - len(chosen))))
+        if len(chosen) < k:
+            rest = [item for item in self.population if item not in chosen]
+            chosen.update(dict.fromkeys(
+                self.rand.sample(rest, k - len(chosen))
+            ))
+        return list(chosen)[:k]
+
+
+class Progress:
+    def __init__(self, stdout, label, total):
+        self.stdout = stdout
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.started = self.reported = time.perf_counter()
+
+    def update(self, count):
+        self.done += count
+        now = time.perf_counter()
+        if now - self.reported < 1 and self.done < self.total:
+            return
+        self.reported = now
+        elapsed = now - self.started
+        self.stdout.write(
+            f'{self.label}: {self.done}/{self.total} '
+            f'({self.done * 100 // max(self.total, 1)}%), '
+            f'{self.done / elapsed if elapsed else self.done:.0f} строк/с'
+        )
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные: пользователей, рецепты, '
+            'избранное, списки покупок и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--favorites-per-user', type=float, default=20)
+        parser.add_argument('--carts-per-user', type=float, default=5)
+        parser.add_argument('--follows-per-user', type=float, default=10)
+        parser.add_argument('--max-ingredients', type=int, default=20)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности '
+                 'и числа ингредиентов и тегов в рецепте.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--ingredients', default=INGREDIENTS_CSV,
+                            help='CSV со справочником ингредиентов.')
+
+    def handle(self, *args, **options):
+        self.rand = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.exponent = options['zipf']
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        if options['max_ingredients'] < 2:
+            raise CommandError('--max-ingredients должен быть не меньше 2.')
+        started = time.perf_counter()
+        call_command('load_csv', options['ingredients'], stdout=self.stdout)
+        Tag.objects.bulk_create(
+            (Tag(name=name, color=color, slug=slug)
+             for name, color, slug in TAGS),
+            ignore_conflicts=True,
+        )
+        tag_catalog.invalidate()
+        user_ids = self.create_users(options['users'])
+        # Активность пользователей и популярность авторов не совпадают.
+        authors = Zipf(self.rand, self.shuffled(user_ids), self.exponent)
+        recipe_ids = self.create_recipes(
+            options['recipes'], authors, options['max_ingredients']
+        )
+        users = Zipf(self.rand, self.shuffled(user_ids), self.exponent)
+        if recipe_ids:
+            recipes = Zipf(self.rand, self.shuffled(recipe_ids),
+                           self.exponent)
+            for model, per_user in (
+                (Favorite, options['favorites_per_user']),
+                (Cart, options['carts_per_user']),
+            ):
+                self.create_links(
+                    model, 'recipe_id', users, recipes,
+                    int(len(user_ids) * per_user),
+                )
+        if len(user_ids) > 1:
+            self.create_links(
+                Follow, 'author_id', users, authors,
+                int(len(user_ids) * options['follows_per_user']),
+            )
+        call_command('recount_counters', stdout=self.stdout)
+        ingredient_catalog.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с.'
+        ))
+
+    def shuffled(self, items):
+        items = list(items)
+        self.rand.shuffle(items)
+        return items
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    def insert(self, model, objects):
+        """bulk_create, возвращающий pk и на SQLite."""
+        model.objects.bulk_create(objects)
+        if objects and objects[0].pk is None:
+            # SQLite не возвращает pk из bulk_create.
+            return list(model.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:len(objects)])[::-1]
+        return [obj.pk for obj in objects]
+
+    def create_users(self, total):
+        progress = Progress(self.stdout, 'Пользователи', total)
+        offset = User.objects.count()
+        user_ids = []
+        for size in self.batches(total):
+            index = offset + len(user_ids)
+            with transaction.atomic():
+                user_ids += self.insert(User, [
+                    User(
+                        username=f'seed_{number}',
+                        email=f'seed_{number}@example.com',
+                        first_name='Seed',
+                        last_name=str(number),
+                        password='!',
+                    )
+                    for number in range(index, index + size)
+                ])
+            progress.update(size)
+        return user_ids
+
+    def create_recipes(self, total, authors, max_ingredients):
+        progress = Progress(self.stdout, 'Рецепты', total)
+        tag_ids = self.shuffled(
+            Tag.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        ingredient_ids = self.shuffled(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Нет тегов или ингредиентов.')
+        tags = Zipf(self.rand, tag_ids, self.exponent)
+        ingredients = Zipf(self.rand, ingredient_ids, self.exponent)
+        tag_counts = Zipf(
+            self.rand, range(1, len(tag_ids) + 1), self.exponent
+        )
+        ingredient_counts = Zipf(
+            self.rand, range(2, max_ingredients + 1), self.exponent
+        )
+        now = timezone.now()
+        recipe_ids = []
+        for size in self.batches(total):
+            number = len(recipe_ids)
+            with transaction.atomic():
+                batch_ids = self.insert(Recipe, [
+                    Recipe(
+                        author_id=authors.choice(),
+                        name=f'Рецепт {number + index}',
+                        text='Сгенерированный рецепт',
+                        cooking_time=min(600, max(1, int(
+                            self.rand.lognormvariate(3.3, 0.7)))),
+                        pub_date=now - timedelta(
+                            seconds=self.rand.randrange(365 * 24 * 3600)),
+                    )
+                    for index in range(size)
+                ])
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in batch_ids
+                    for tag_id in tags.distinct(tag_counts.choice())
+                )
+                AmountOfIngridients.objects.bulk_create(
+                    AmountOfIngridients(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rand.randint(1, 500),
+                    )
+                    for recipe_id in batch_ids
+                    for ingredient_id in ingredients.distinct(
+                        ingredient_counts.choice())
+                )
+            recipe_ids += batch_ids
+            progress.update(size)
+        return recipe_ids
+
+    def create_links(self, model, field, users, targets, total):
+        """Связи пользователь-объект; повторы отбрасываются БД."""
+        progress = Progress(self.stdout, model._meta.verbose_name_plural,
+                            total)
+        for size in self.batches(total):
+            pairs = {
+                (user_id, target_id)
+                for user_id, target_id in zip(
+                    users.choices(size), targets.choices(size))
+                if model is not Follow or user_id != target_id
+            }
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    (model(user_id=user_id, **{field: target_id})
+                     for user_id, target_id in sorted(pairs)),
+                    ignore_conflicts=True,
+                )
+            progress.update(size)
@@ -1,5 +1,7 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.utils import timezone
 from colorfield.fields import ColorField
 
 from users.models import User
@@ -56,6 +58,38 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def for_reading(self, user):
+        """Флаги user и всё, что выводит ReadRecipeSerializer."""
+        authors = User.objects.with_is_subscribed(user).prefetch_related(
+            'recipes'
+        )
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'amountingridients',
+                queryset=AmountOfIngridients.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -72,6 +106,28 @@ class Recipe(models.Model):
         upload_to='recipes/',
         blank=True,
     )
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        null=True,
+        editable=False,
+    )
+    image_thumbnail = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='recipes/renditions/',
+        blank=True,
+        editable=False,
+    )
+    image_webp = models.ImageField(
+        verbose_name='Картинка WebP',
+        upload_to='recipes/renditions/',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Текст'
     )
@@ -100,11 +156,46 @@ class Recipe(models.Model):
             )
         ]
     )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        default=timezone.now,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('author', '-id'),
+                name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_recent_idx'
+            ),
+            models.Index(
+                fields=('cooking_time', '-id'),
+                name='recipe_quick_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -138,7 +229,7 @@ class AmountOfIngridients(models.Model):
         verbose_name_plural = 'Ингредиенты в рецепте'
         constraints = (
             models.UniqueConstraint(
-                fields=('ingredient', 'recipe',),
+                fields=('recipe', 'ingredient',),
                 name='unique_ingredients_recipe'
             ),
         )
@@ -0,0 +1,142 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+TABLE_ROWS_TIMEOUT = 60
+
+
+def is_estimable(queryset):
+    return (
+        hasattr(queryset, 'query')
+        and connections[queryset.db].vendor == 'postgresql'
+    )
+
+
+def estimate_table_rows(model, using):
+    """pg_class.reltuples таблицы модели, None до первого ANALYZE."""
+    table = model._meta.db_table
+    key = f'reltuples:{using}:{table}'
+    rows = cache.get(key)
+    if rows is None:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                (table,),
+            )
+            row = cursor.fetchone()
+        # reltuples = -1 (или 0 до первого ANALYZE): статистики нет.
+        rows = int(row[0]) if row and row[0] > 0 else -1
+        cache.set(key, rows, TABLE_ROWS_TIMEOUT)
+    return rows if rows >= 0 else None
+
+
+def estimate_count(queryset):
+    """Оценка числа строк queryset по статистике планировщика PostgreSQL.
+
+    Без фильтров берётся reltuples таблицы, иначе - Plan Rows из
+    EXPLAIN. Возвращает None, если оценка недоступна.
+    """
+    if not is_estimable(queryset):
+        return None
+    query = queryset.query
+    if not query.where and not query.distinct:
+        return estimate_table_rows(queryset.model, queryset.db)
+    sql, params = query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class IdCountPaginator(Paginator):
+    """Paginator, который считает только id.
+
+    Аннотации, сортировка и select_related выборки в COUNT не попадают.
+    """
+
+    def get_count_queryset(self):
+        return self.object_list.order_by().values('pk')
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        return self.get_count_queryset().count()
+
+
+class EstimatedPage(Page):
+    """Страница, наличие следующей страницы у которой известно точно."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(IdCountPaginator):
+    """Paginator с приблизительным count на больших таблицах.
+
+    Точный COUNT(*) выполняется, если таблица или оценка выборки меньше
+    ESTIMATED_COUNT_THRESHOLD либо оценку нельзя получить. Оценка
+    используется только для count: границы выборки и наличие следующей
+    страницы определяются по строкам, выбранным с запасом в одну.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+        if not is_estimable(self.object_list):
+            return super().count
+        queryset = self.get_count_queryset()
+        # Фильтры не увеличивают выборку: маленькую таблицу дешевле
+        # посчитать точно, чем планировать запрос ради оценки.
+        table_rows = estimate_table_rows(queryset.model, queryset.db)
+        if table_rows is None or table_rows < threshold:
+            return super().count
+        estimate = estimate_count(queryset)
+        if estimate is None or estimate < threshold:
+            return super().count
+        self.estimated = True
+        return estimate
+
+    def validate_number(self, number):
+        if not self.count_is_estimated():
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def count_is_estimated(self):
+        return self.count is not None and self.estimated
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        # Дойдя до конца выборки, count можно указать точно; иначе он
+        # не меньше числа уже увиденных строк.
+        seen = bottom + len(rows)
+        self.count = max(self.count, seen + 1) if has_next else seen
+        self.__dict__.pop('num_pages', None)
+        return EstimatedPage(rows, number, self, has_next)
@@ -0,0 +1,83 @@
+import logging
+from bisect import bisect_left
+from threading import Lock
+
+from django.db import DatabaseError, connections, transaction
+
+from recipes.catalog import ingredient_catalog
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_INDEX_NAME = 'recipes_ingredient_name_trgm'
+
+
+def create_trigram_index(using='default'):
+    """Создаёт pg_trgm GIN индекс для поиска ингредиентов по подстроке.
+
+    Индекс строится по UPPER(name), т.е. по тому же выражению, что
+    Django генерирует для lookup'ов icontains/istartswith. На других
+    СУБД и без расширения pg_trgm ничего не делает.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError as error:
+        logger.warning('pg_trgm недоступно, индекс не создан: %s', error)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX_NAME} '
+            'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)'
+        )
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Используется вместо pg_trgm на СУБД без триграммного поиска.
+    Перестраивается при смене снимка ingredient_catalog.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._source = None
+        self._entries = []
+        self._lock = Lock()
+
+    def get_entries(self):
+        snapshot = self.catalog.snapshot()
+        if self._source is not snapshot:
+            with self._lock:
+                if self._source is not snapshot:
+                    self._entries = sorted(
+                        (item.name.lower(), item.pk)
+                        for item in snapshot.items
+                    )
+                    self._source = snapshot
+        return self._entries
+
+    def search(self, query, limit):
+        """Возвращает id ингредиентов: сначала по префиксу, затем
+        по подстроке, в алфавитном порядке внутри каждой группы."""
+        entries = self.get_entries()
+        query = query.lower()
+        found = []
+        position = bisect_left(entries, (query,))
+        while (
+            position < len(entries) and len(found) < limit
+            and entries[position][0].startswith(query)
+        ):
+            found.append(entries[position][1])
+            position += 1
+        for name, pk in entries:
+            if len(found) >= limit:
+                break
+            if query in name and not name.startswith(query):
+                found.append(pk)
+        return found
+
+
+ingredient_index = IngredientIndex(ingredient_catalog)
@@ -0,0 +1,52 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.counters import COUNTERS
+from recipes.images import schedule_renditions
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from users.models import Follow
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalog(**kwargs):
+    ingredient_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_catalog(**kwargs):
+    tag_catalog.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_renditions(instance, **kwargs):
+    schedule_renditions(instance)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет денормализованный счётчик на delta."""
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    model.objects.filter(pk=pk).update(**{field: value})
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, key, field = COUNTERS[sender]
+        change_counter(model, getattr(instance, key), field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(sender, instance, **kwargs):
+    model, key, field = COUNTERS[sender]
+    change_counter(model, getattr(instance, key), field, -1)
@@ -0,0 +1,222 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import EmptyPage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.cache import recipe_list_cache
+from recipes.images import RENDITIONS, build_renditions, is_rendition_ready
+from recipes.models import Favorite, Ingredient, Recipe
+from recipes.paginator import EstimatedCountPaginator
+from users.models import User
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=1)
+class EstimatedCountPaginatorTests(TestCase):
+    total = 20
+    per_page = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password',
+        )
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {number}', text='Текст',
+                   cooking_time=1)
+            for number in range(cls.total)
+        )
+
+    def paginate(self, estimate):
+        with mock.patch('recipes.paginator.is_estimable',
+                        return_value=True), \
+                mock.patch('recipes.paginator.estimate_table_rows',
+                           return_value=estimate), \
+                mock.patch('recipes.paginator.estimate_count',
+                           return_value=estimate):
+            paginator = EstimatedCountPaginator(
+                Recipe.objects.all(), self.per_page
+            )
+            paginator.count
+        return paginator
+
+    def walk(self, estimate):
+        ids, number = [], 1
+        while True:
+            page = self.paginate(estimate).page(number)
+            ids += [recipe.pk for recipe in page]
+            if not page.has_next():
+                return ids, page
+            number = page.next_page_number()
+
+    def test_walks_all_pages_whatever_the_estimate(self):
+        expected = list(Recipe.objects.values_list('pk', flat=True))
+        for estimate in (5, self.total, 100):
+            with self.subTest(estimate=estimate):
+                ids, last_page = self.walk(estimate)
+                self.assertEqual(ids, expected)
+                self.assertEqual(last_page.paginator.count, self.total)
+
+    def test_page_past_the_end_is_empty(self):
+        with self.assertRaises(EmptyPage):
+            self.paginate(100).page(5)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'recipes': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+})
+class LoadCsvUpdateUnitsTests(TestCase):
+    """--update-units не зависит от --batch-size."""
+
+    def load(self, rows, batch_size, stdout=None):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', delete=False
+        ) as file:
+            file.write('\n'.join(rows))
+        self.addCleanup(os.remove, file.name)
+        call_command(
+            'load_csv', file.name, update_units=True, batch_size=batch_size,
+            stdout=stdout or StringIO(),
+        )
+        return sorted(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ))
+
+    def test_name_repeated_in_file_is_not_updated(self):
+        for batch_size in (1, 500):
+            with self.subTest(batch_size=batch_size):
+                Ingredient.objects.all().delete()
+                Ingredient.objects.create(name='соль', measurement_unit='л')
+                self.assertEqual(
+                    self.load(['соль,кг', 'соль,г'], batch_size),
+                    [('соль', 'г'), ('соль', 'кг'), ('соль', 'л')],
+                )
+
+    def test_unique_name_is_updated(self):
+        for batch_size in (1, 500):
+            with self.subTest(batch_size=batch_size):
+                Ingredient.objects.all().delete()
+                Ingredient.objects.create(name='соль', measurement_unit='л')
+                self.assertEqual(
+                    self.load(['перец,г', 'соль,кг'], batch_size),
+                    [('перец', 'г'), ('соль', 'кг')],
+                )
+
+    def test_conflicting_rows_are_not_counted_as_inserted(self):
+        # Строку добавляет «параллельный» процесс между чтением
+        # существующих ингредиентов и вставкой.
+        def insert_concurrently(*args, **kwargs):
+            Ingredient.objects.create(name='соль', measurement_unit='кг')
+
+        stdout = StringIO()
+        with mock.patch.object(Ingredient.objects, 'bulk_update',
+                               side_effect=insert_concurrently):
+            self.load(['соль,кг', 'перец,г'], 500, stdout)
+        self.assertIn(
+            'Добавлено: 1, обновлено: 0, пропущено: 1', stdout.getvalue()
+        )
+
+    def test_invalidates_recipe_list_cache(self):
+        token = recipe_list_cache.get_tokens(['global'])
+        self.load(['соль,кг'], 500)
+        self.assertNotEqual(recipe_list_cache.get_tokens(['global']), token)
+
+
+class RecountCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=1,
+        )
+        Favorite.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def recount(self, **options):
+        stdout = StringIO()
+        call_command('recount_counters', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def break_counters(self):
+        Recipe.objects.update(favorites_count=5)
+        User.objects.update(recipes_count=0)
+
+    def test_repairs_and_reports_fixed_rows(self):
+        self.break_counters()
+        self.assertIn('Исправлено расхождений: 2.', self.recount())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        output = self.recount()
+        self.assertIn('Счётчики в порядке.', output)
+        self.assertNotIn('Исправлено', output)
+
+    def test_check_does_not_repair(self):
+        self.break_counters()
+        with self.assertRaises(CommandError):
+            self.recount(check=True)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 5)
+
+
+class RenditionTests(TestCase):
+    """Миниатюры картинок с одинаковым именем не перетирают друг друга."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password',
+        )
+
+    def create_recipe(self, name, image_format, size):
+        buffer = BytesIO()
+        Image.new('RGB', size).save(buffer, image_format)
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Текст', cooking_time=1,
+            image=default_storage.save(name, ContentFile(buffer.getvalue())),
+        )
+
+    def build(self, recipe):
+        # Воркер закрывает соединения своего потока, а тест идёт в
+        # транзакции основного.
+        with mock.patch('recipes.images.connections'):
+            build_renditions(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db()
+
+    def test_same_stem_different_extension(self):
+        first = self.create_recipe('recipes/photo.jpg', 'JPEG', (40, 20))
+        second = self.create_recipe('recipes/photo.png', 'PNG', (20, 40))
+        for recipe in (first, second):
+            self.build(recipe)
+        first.refresh_from_db()
+        for field in RENDITIONS:
+            with self.subTest(field=field):
+                self.assertTrue(is_rendition_ready(first, field))
+                self.assertTrue(is_rendition_ready(second, field))
+                first_file = getattr(first, field)
+                second_file = getattr(second, field)
+                self.assertNotEqual(first_file.name, second_file.name)
+                with Image.open(first_file.path) as image:
+                    self.assertGreater(image.width, image.height)
+                with Image.open(second_file.path) as image:
+                    self.assertLess(image.width, image.height)
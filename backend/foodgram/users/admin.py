@@ -1,16 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from recipes.admin import LargeTableAdmin
+from recipes.paginator import EstimatedCountPaginator
 from users.models import Follow, User
 
 
 class UserAdmin(UserAdmin):
-    list_display = ('email', 'first_name', 'last_name', 'username')
+    list_display = ('email', 'first_name', 'last_name', 'username',
+                    'recipes_count', 'followers_count')
     search_fields = ('username', 'email')
     empty_value_display = '-empty-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author',)
     search_fields = (
         'author__username',
@@ -18,6 +23,8 @@ class FollowAdmin(admin.ModelAdmin):
         'user__username',
         'user__email',
     )
+    autocomplete_fields = ('user', 'author')
+    related_fields = ('user', 'author')
     empty_value_display = '-empty-'
 
 
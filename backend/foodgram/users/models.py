@@ -1,6 +1,24 @@
-from django.contrib.auth.models import AbstractUser
-from django.db.models import (CASCADE, CharField, EmailField, ForeignKey,
-                              Model, UniqueConstraint)
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db.models import (CASCADE, BooleanField, CharField, EmailField,
+                              Exists, ForeignKey, Model, OuterRef,
+                              PositiveIntegerField, QuerySet,
+                              UniqueConstraint, Value)
+
+
+class UserQuerySet(QuerySet):
+    def with_is_subscribed(self, user):
+        """Аннотирует пользователей флагом подписки на них user."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -22,10 +40,22 @@ class User(AbstractUser):
         unique=True,
         max_length=50
     )
+    recipes_count = PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
+    objects = CustomUserManager()
+
     class Meta:
         ordering = ('username',)
         verbose_name = 'Пользователь'
@@ -53,7 +83,7 @@ class Follow(Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         constraints = [
-            UniqueConstraint(fields=['author', 'user'],
+            UniqueConstraint(fields=['user', 'author'],
                              name='unique_follower')
         ]
 